@@ -1,56 +1,127 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
-from datetime import datetime
+from pydantic.config import ConfigDict
+from pydantic.fields import Field
+from pydantic.functional_validators import AfterValidator
+from pydantic.main import BaseModel
+from pydantic.type_adapter import TypeAdapter
+from dataclasses import dataclass, field, fields
+from typing import Annotated, List, Literal, Optional
+from datetime import datetime, timezone
+import re
 import uuid
 
+_UTC = timezone.utc
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def new_id() -> str:
+    """Id for a new document (32 hex chars), shared by model defaults and raw inserts"""
+    return uuid.uuid4().hex
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime, the form MongoDB hands stored dates back in"""
+    return datetime.now(_UTC).replace(tzinfo=None)
+
+def _normalize_email(value: str) -> str:
+    value = value.strip().lower()
+    if not _EMAIL_RE.match(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+# Shared field types
+IdField = Annotated[str, Field(default_factory=new_id)]
+Timestamp = Annotated[datetime, Field(default_factory=utcnow)]
+OptDatetime = Optional[datetime]
+OptStr = Optional[str]
+OptFloat = Optional[float]
+Email = Annotated[str, AfterValidator(_normalize_email)]
+
+# Allowed values for discriminator fields
+AssetType = Literal["stock", "etf", "crypto"]
+TradeType = Literal["buy", "sell"]
+AlertType = Literal["price_above", "price_below", "volatility_high"]
+CashTransactionType = Literal["deposit", "withdrawal"]
+RecommendationType = Literal["warning", "info", "success"]
+Priority = Literal["high", "medium", "low"]
+
+# Base Model
+class AppModel(BaseModel):
+    """Shared Pydantic v2 configuration for every API model"""
+    # Models nested into other models are trusted: never re-validate/copy them, and skip assignment checks
+    model_config = ConfigDict(
+        extra="ignore",
+        populate_by_name=True,
+        ser_json_timedelta="iso8601",
+        revalidate_instances="never",
+        validate_assignment=False,
+    )
+
+    @classmethod
+    def from_db(cls, row: dict):
+        """Build an instance from a trusted MongoDB document, skipping validation"""
+        return cls.model_construct(**row)
+
+class Record:
+    """Mixin giving slotted dataclass records the model_dump/from_db API used for AppModel"""
+    __slots__ = ()
+
+    def model_dump(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_db(cls, row: dict):
+        return cls(**{f.name: row[f.name] for f in fields(cls) if f.name in row})
+
 # User Models
-class UserCreate(BaseModel):
+class UserCreate(AppModel):
     name: str
-    email: EmailStr
+    email: Email
     password: str
 
-class UserLogin(BaseModel):
-    email: EmailStr
+class UserLogin(AppModel):
+    email: Email
     password: str
 
-class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class User(AppModel):
+    id: IdField
     name: str
     email: str
     password_hash: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Timestamp
+
+class UserResponse(AppModel):
+    model_config = ConfigDict(frozen=True)
 
-class UserResponse(BaseModel):
     id: str
     name: str
     email: str
 
 # Position Models
-class PositionCreate(BaseModel):
+class PositionCreate(AppModel):
     symbol: str
-    type: str  # "stock", "etf" or "crypto"
-    transaction_type: str = "buy"  # "buy" or "sell"
+    type: AssetType
+    transaction_type: TradeType = "buy"
     quantity: float
     avg_price: float
-    purchase_date: Optional[datetime] = None
-    portfolio_id: Optional[str] = None
+    purchase_date: OptDatetime = None
+    portfolio_id: OptStr = None
     link_to_cash: bool = False  # Link transaction to cash balance
-    cash_currency: Optional[str] = None  # Currency for cash operation (EUR, USD, etc.)
+    cash_currency: OptStr = None  # Currency for cash operation (EUR, USD, etc.)
 
-class Position(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Position(AppModel):
+    id: IdField
     user_id: str
-    portfolio_id: Optional[str] = None  # Lié à un portefeuille spécifique
+    portfolio_id: OptStr = None  # Lié à un portefeuille spécifique
     symbol: str
     name: str
-    type: str
+    type: AssetType
     quantity: float
     avg_price: float
-    purchase_date: datetime = Field(default_factory=datetime.utcnow)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    purchase_date: Timestamp
+    created_at: Timestamp
+    updated_at: Timestamp
 
 class PositionWithMetrics(Position):
+    model_config = ConfigDict(frozen=True)
+
     current_price: float
     total_value: float
     invested: float
@@ -62,61 +133,76 @@ class PositionWithMetrics(Position):
     last_update: str
 
 # Transaction Models
-class TransactionCreate(BaseModel):
+class TransactionCreate(AppModel):
     symbol: str
-    type: str  # "buy" or "sell"
+    type: TradeType
     quantity: float
     price: float
 
-class Transaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Transaction(AppModel):
+    id: IdField
     user_id: str
     symbol: str
-    type: str
+    type: TradeType
     quantity: float
     price: float
     total: float
-    date: datetime = Field(default_factory=datetime.utcnow)
+    date: Timestamp
+    portfolio_id: OptStr = None
 
 # Portfolio Models
-class PortfolioCreate(BaseModel):
+class PortfolioCreate(AppModel):
     name: str
-    description: Optional[str] = ""
+    description: OptStr = ""
     is_default: bool = False
 
-class Portfolio(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Portfolio(AppModel):
+    id: IdField
     user_id: str
     name: str
-    description: Optional[str] = ""
+    description: OptStr = ""
     is_default: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Timestamp
+
+class VolatilityMetrics(AppModel):
+    model_config = ConfigDict(frozen=True)
+
+    historical: float = 0.0  # Annualized volatility over the last year, in %
+    realized: float = 0.0  # Annualized volatility since purchase, in %
+
+class PortfolioSummary(AppModel):
+    model_config = ConfigDict(frozen=True)
 
-class PortfolioSummary(BaseModel):
     total_value: float
     total_invested: float
     total_gain_loss: float
     gain_loss_percent: float
     daily_change: float
     daily_change_percent: float
-    volatility: dict
+    volatility: VolatilityMetrics
     beta: float
     sharpe_ratio: float
 
 # Analytics Models
-class CorrelationItem(BaseModel):
+class CorrelationItem(AppModel):
+    model_config = ConfigDict(frozen=True)
+
     symbol1: str
     symbol2: str
     correlation: float
 
-class Recommendation(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    type: str  # "warning", "info", "success"
+class Recommendation(AppModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: IdField
+    type: RecommendationType
     title: str
     description: str
-    priority: str  # "high", "medium", "low"
+    priority: Priority
+
+class MarketQuote(AppModel):
+    model_config = ConfigDict(frozen=True)
 
-class MarketQuote(BaseModel):
     symbol: str
     name: str
     price: float
@@ -125,128 +211,151 @@ class MarketQuote(BaseModel):
     volume: int
 
 # Performance Models
-class PerformanceData(BaseModel):
+class PerformanceData(AppModel):
+    model_config = ConfigDict(frozen=True)
+
     date: str
     value: float
     change_percent: float
 
-class PerformanceResponse(BaseModel):
-    symbol: Optional[str] = None
+class PerformanceResponse(AppModel):
+    symbol: OptStr = None
     period: str
     data: List[PerformanceData]
     total_return: float
     total_return_percent: float
 
+class PerformanceResponseCompact(AppModel):
+    """Column-oriented performance payload: parallel arrays instead of one object per day"""
+    symbol: OptStr = None
+    period: str
+    dates: List[str]
+    values: List[float]
+    change_percents: List[float]
+    total_return: float
+    total_return_percent: float
+
 # Dividend Models
-class DividendCreate(BaseModel):
+class DividendCreate(AppModel):
     position_id: str
     amount: float
     date: datetime
-    notes: Optional[str] = None
+    notes: OptStr = None
 
-class Dividend(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Dividend(AppModel):
+    id: IdField
     user_id: str
     position_id: str
     symbol: str
     amount: float
     date: datetime
-    notes: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    notes: OptStr = None
+    created_at: Timestamp
 
 # Alert Models
-class AlertCreate(BaseModel):
+class AlertCreate(AppModel):
     symbol: str
-    alert_type: str  # "price_above", "price_below", "volatility_high"
+    alert_type: AlertType
     target_value: float
-    notes: Optional[str] = None
+    notes: OptStr = None
 
-class Alert(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Alert(AppModel):
+    id: IdField
     user_id: str
     symbol: str
-    alert_type: str  # "price_above", "price_below"
+    alert_type: AlertType
     target_value: float
     is_active: bool = True
     is_triggered: bool = False
     is_acknowledged: bool = False  # User has seen/dismissed the notification
-    triggered_at: Optional[datetime] = None
-    triggered_price: Optional[float] = None
-    notes: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    triggered_at: OptDatetime = None
+    triggered_price: OptFloat = None
+    notes: OptStr = None
+    created_at: Timestamp
 
 # Goal Models
-class GoalCreate(BaseModel):
+class GoalCreate(AppModel):
     title: str
     target_amount: float
-    target_date: Optional[datetime] = None
-    description: Optional[str] = None
+    target_date: OptDatetime = None
+    description: OptStr = None
 
-class Goal(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class Goal(AppModel):
+    id: IdField
     user_id: str
     title: str
     target_amount: float
-    target_date: Optional[datetime] = None
-    description: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    target_date: OptDatetime = None
+    description: OptStr = None
+    created_at: Timestamp
     is_completed: bool = False
 
 # Note Models
-class NoteCreate(BaseModel):
+class NoteCreate(AppModel):
     position_id: str
     content: str
 
-class Note(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+@dataclass(slots=True, kw_only=True)
+class Note(Record):
+    id: str = field(default_factory=new_id)
     user_id: str
     position_id: str
     content: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = field(default_factory=utcnow)
+    updated_at: datetime = field(default_factory=utcnow)
 
 # Budget Models
-class BudgetCreate(BaseModel):
+class BudgetCreate(AppModel):
     monthly_amount: float
     start_date: datetime
 
-class Budget(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+@dataclass(slots=True, kw_only=True)
+class Budget(Record):
+    id: str = field(default_factory=new_id)
     user_id: str
     monthly_amount: float
     start_date: datetime
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = field(default_factory=utcnow)
 
 # Cash Models
-class CashTransactionCreate(BaseModel):
-    type: str  # "deposit" or "withdrawal"
+class CashTransactionCreate(AppModel):
+    type: CashTransactionType
     amount: float
-    description: Optional[str] = None
-    date: Optional[datetime] = None
+    description: OptStr = None
+    date: OptDatetime = None
 
-class CashTransaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+class CashTransaction(AppModel):
+    id: IdField
     user_id: str
-    type: str
+    type: CashTransactionType
     amount: float
-    description: Optional[str] = None
-    date: datetime = Field(default_factory=datetime.utcnow)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    description: OptStr = None
+    date: Timestamp
+    created_at: Timestamp
 
-class CashBalance(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+@dataclass(slots=True, kw_only=True)
+class CashBalance(Record):
+    id: str = field(default_factory=new_id)
     user_id: str
     balance: float = 0.0
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=utcnow)
 
 # User Settings Models
-class UserSettingsUpdate(BaseModel):
-    risk_free_rate: Optional[float] = None  # Taux sans risque en % (ex: 3.5 pour 3.5%)
-    benchmark_index: Optional[str] = None  # Index de référence (ex: ^FCHI, ^GSPC, URTH)
+class UserSettingsUpdate(AppModel):
+    risk_free_rate: OptFloat = None  # Taux sans risque en % (ex: 3.5 pour 3.5%)
+    benchmark_index: OptStr = None  # Index de référence (ex: ^FCHI, ^GSPC, URTH)
 
-class UserSettings(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+@dataclass(slots=True, kw_only=True)
+class UserSettings(Record):
+    id: str = field(default_factory=new_id)
     user_id: str
     risk_free_rate: float = 3.0  # Default 3% (typical for government bonds)
     benchmark_index: str = "^GSPC"  # Default S&P 500
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=utcnow)
+
+# List adapters, built once so list responses and bulk inserts reuse the same core schema
+POSITION_LIST_ADAPTER = TypeAdapter(List[Position])
+DIVIDEND_LIST_ADAPTER = TypeAdapter(List[Dividend])
+ALERT_LIST_ADAPTER = TypeAdapter(List[Alert])
+GOAL_LIST_ADAPTER = TypeAdapter(List[Goal])
+NOTE_LIST_ADAPTER = TypeAdapter(List[Note])
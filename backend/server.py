@@ -1,28 +1,41 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, Body, Header, HTTPException, Depends, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic.main import BaseModel
+from pydantic.type_adapter import TypeAdapter
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
+import hashlib
+import hmac
 import logging
-import uuid
+import time
+import orjson
+import numpy as np
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional
 from datetime import datetime
 from passlib.context import CryptContext
 from models import (
     UserCreate, UserLogin, User, UserResponse,
-    PositionCreate, Position, PositionWithMetrics,
-    TransactionCreate, Transaction,
-    PortfolioCreate, Portfolio, PortfolioSummary,
-    CorrelationItem, Recommendation,
-    PerformanceResponse, DividendCreate, Dividend,
+    PositionCreate, Position, Transaction,
+    PortfolioCreate, Portfolio,
+    PerformanceResponse, PerformanceResponseCompact, DividendCreate, Dividend,
     AlertCreate, Alert, GoalCreate, Goal,
     NoteCreate, Note, BudgetCreate, Budget,
     CashTransactionCreate, CashTransaction, CashBalance,
-    UserSettingsUpdate, UserSettings
+    UserSettingsUpdate, UserSettings,
+    POSITION_LIST_ADAPTER, DIVIDEND_LIST_ADAPTER, ALERT_LIST_ADAPTER,
+    GOAL_LIST_ADAPTER, NOTE_LIST_ADAPTER, new_id, utcnow
 )
-from utils.yahoo_finance import YahooFinanceService
-from utils.portfolio_analytics import PortfolioAnalytics
+from utils.cache import cache_get, cache_invalidate, cache_set
+from utils.yahoo_finance import YahooFinanceService, PRICE_CACHE_DURATION
+from utils.portfolio_analytics import PortfolioAnalytics, METRICS_CACHE_DURATION
 from utils.performance_service import PerformanceService
 from utils.sector_analysis import SectorAnalysisService
 from utils.alert_manager import AlertManager
@@ -32,11 +45,25 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Pool sized for bursts of concurrent requests (each may fan out into several gathered queries), with
+# short timeouts so a missing database fails fast, and wire compression for large cursor payloads
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 200)),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 10)),
+    serverSelectionTimeoutMS=5000,
+    connectTimeoutMS=5000,
+    waitQueueTimeoutMS=5000,
+    compressors=os.environ.get('MONGO_COMPRESSORS', 'zlib')
+)
 db = client[os.environ['DB_NAME']]
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (cost factor configurable; existing hashes keep verifying with their own rounds)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=int(os.environ.get('BCRYPT_ROUNDS', 12))
+)
 
 # Services
 yf_service = YahooFinanceService()
@@ -45,28 +72,251 @@ performance_service = PerformanceService()
 sector_service = SectorAnalysisService()
 alert_manager = AlertManager()
 
+# orjson response class (numpy scalars and non-str keys allowed). A handler's plain return value still goes
+# through FastAPI's jsonable_encoder before reaching render(), so hot routes build this response themselves
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+class AppJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
 # Create the main app without a prefix
-app = FastAPI(title="PortfolioHub API")
+app = FastAPI(title="PortfolioHub API", default_response_class=AppJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+NO_ID = {"_id": 0}  # projection leaving out MongoDB's ObjectId
+POSITION_FIELDS = {"_id": 0, "symbol": 1, "type": 1, "quantity": 1, "avg_price": 1, "purchase_date": 1}  # what analytics reads
+CONTRIBUTION_FIELDS = {"_id": 0, "type": 1, "amount": 1}  # enough to total deposits/withdrawals
+ID_FIELD = {"_id": 0, "id": 1}  # existence checks that only need the document's id
+SETTINGS_FIELDS = {"_id": 0, "risk_free_rate": 1, "benchmark_index": 1, "updated_at": 1}
+CASH_ACCOUNT_FIELDS = {"_id": 0, "id": 1, "portfolio_id": 1, "currency": 1, "balance": 1, "updated_at": 1}  # what /cash-accounts returns
+
+# Body of the bulk endpoints: one $in query per request, so cap how many ids it may carry
+BULK_MAX_IDS = 1000
+BulkIds = Annotated[List[str], Body(max_length=BULK_MAX_IDS)]
+
+IMPORT_LOOKUP_CONCURRENCY = 16  # parallel ticker lookups during CSV import
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt is CPU-bound (~100 ms): run it in a worker thread so the event loop keeps serving requests
+async def hash_password(password: str) -> str:
+    return await asyncio.to_thread(pwd_context.hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
 
 async def get_user_by_email(email: str) -> Optional[dict]:
-    return await db.users.find_one({"email": email})
+    # Emails are stored normalized (see normalize_user_emails for older accounts): an exact, indexed match
+    return await db.users.find_one({"email": email}, NO_ID)
 
 async def get_current_user(user_id: str) -> dict:
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one({"id": user_id}, NO_ID)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+# Admin endpoints need the X-Admin-Token header to match ADMIN_TOKEN; without ADMIN_TOKEN they stay disabled
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+async def require_admin(x_admin_token: str = Header("")) -> None:
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+def model_json(model: BaseModel) -> Response:
+    """Serialize a Pydantic model with pydantic-core straight to JSON bytes (no jsonable_encoder walk)"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+def json_list(adapter: TypeAdapter, items: list) -> Response:
+    """Serialize a list of models with a prebuilt TypeAdapter straight to JSON bytes"""
+    return Response(content=adapter.dump_json(items), media_type="application/json")
+
+def cacheable_json(request: Request, content, max_age: int, private: bool = False) -> Response:
+    """JSON response with Cache-Control and a content-hash ETag; answers 304 when the client's copy is current"""
+    response = AppJSONResponse(content)
+    etag = f'"{hashlib.blake2b(response.body, digest_size=16).hexdigest()}"'
+    # max_age=0: the client may store the response but must revalidate it on every use
+    freshness = f"max-age={max_age}" if max_age else "no-cache"
+    headers = {"ETag": etag, "Cache-Control": f"{'private' if private else 'public'}, {freshness}"}
+    client_tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+def json_stream(cursor) -> StreamingResponse:
+    """Stream a Mongo cursor as a JSON array as its batches arrive, encoding each (projected) document with orjson"""
+    async def body():
+        separator = b"["
+        async for doc in cursor:
+            yield separator + orjson.dumps(doc, option=ORJSON_OPTIONS)
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+    return StreamingResponse(body(), media_type="application/json")
+
+def _enrich_positions(positions: List[dict], prices: Dict[str, float], metrics: Dict[str, dict]) -> List[dict]:
+    """Attach market values, weights and risk metrics to already-fetched positions"""
+    # Compute value columns for all positions at once, rounding each column in one pass
+    values = analytics_service.calculate_position_values(positions, prices)
+    total_values = np.round(values['total_value'], 2)
+    total_portfolio_value = total_values.sum()
+    if total_portfolio_value > 0:
+        weights = np.round(total_values / total_portfolio_value * 100, 2).tolist()
+    else:
+        weights = [0] * len(positions)
+    position_metrics = [metrics[pos['symbol']] for pos in positions]
+    columns = zip(
+        positions,
+        np.round(values['current_price'], 2).tolist(),
+        total_values.tolist(),
+        np.round(values['invested'], 2).tolist(),
+        np.round(values['gain_loss'], 2).tolist(),
+        np.round(values['gain_loss_percent'], 2).tolist(),
+        weights,
+        [m['beta'] for m in position_metrics],
+        [m['volatility'] for m in position_metrics]
+    )
+    
+    # Attach current market data and metrics: one dict per position, built in a single pass
+    last_update = utcnow().isoformat()
+    enriched_positions = [
+        {
+            **pos,
+            'current_price': current_price,
+            'total_value': total_value,
+            'invested': invested,
+            'gain_loss': gain_loss,
+            'gain_loss_percent': gain_loss_percent,
+            'weight': weight,
+            'beta': beta,
+            'volatility': volatility,
+            'last_update': last_update
+        }
+        for pos, current_price, total_value, invested, gain_loss, gain_loss_percent, weight, beta, volatility in columns
+    ]
+    
+    return enriched_positions
+
+def _summarize(positions: List[dict], prices: Dict[str, float]) -> dict:
+    """Portfolio value, invested total and per-position value rows from already-fetched positions and prices"""
+    values = analytics_service.calculate_position_values(positions, prices)
+    return {
+        'total_value': float(values['portfolio_value']),
+        'total_invested': float(values['invested'].sum()),
+        'positions': [
+            {
+                'symbol': pos['symbol'],
+                'total_value': position_value,
+                'invested': position_invested,
+                'quantity': pos['quantity'],
+                'purchase_date': pos.get('purchase_date')
+            }
+            for pos, position_value, position_invested in zip(
+                positions, values['total_value'].tolist(), values['invested'].tolist()
+            )
+        ]
+    }
+
+def _cash_in_eur(cash_accounts: List[dict]) -> tuple:
+    """Total of non-zero cash balances converted to EUR, plus the per-currency breakdown"""
+    total_cash_eur = 0.0
+    cash_details = []
+    for acc in cash_accounts:
+        currency = acc.get('currency', 'EUR')
+        balance = acc.get('balance', 0)
+        if balance != 0:
+            balance_in_eur = yf_service.convert_to_eur(balance, currency)
+            total_cash_eur += balance_in_eur
+            cash_details.append({
+                'currency': currency,
+                'balance': balance,
+                'balance_eur': round(balance_in_eur, 2)
+            })
+    return total_cash_eur, cash_details
+
+# Request-scoped market context: positions, settings, prices and metrics loaded once per request.
+# FastAPI caches a dependency's result for the duration of a request, so every consumer shares it.
+@dataclass(slots=True)
+class MarketCtx:
+    positions: List[dict]
+    risk_free_rate: float
+    benchmark_index: str
+    prices: Dict[str, float]
+    metrics: Dict[str, dict]
+
+async def default_portfolio_id(user_id: str) -> Optional[str]:
+    """Id of the user's default portfolio, else of their first one, in a single query"""
+    portfolio = await db.portfolios.find_one({"user_id": user_id}, {"_id": 0, "id": 1}, sort=[("is_default", -1)])
+    return portfolio['id'] if portfolio else None
+
+async def ensure_default_portfolio_id(user_id: str) -> str:
+    """Like default_portfolio_id, but creates the default portfolio when the user has none"""
+    portfolio_id = await default_portfolio_id(user_id)
+    if portfolio_id:
+        return portfolio_id
+    # Upsert on the default flag so concurrent first writes settle on the same portfolio
+    new_portfolio = Portfolio(
+        user_id=user_id,
+        name="Portefeuille Principal",
+        description="Mon portefeuille par défaut",
+        is_default=True
+    ).model_dump(exclude={'user_id', 'is_default'})
+    try:
+        portfolio = await db.portfolios.find_one_and_update(
+            {"user_id": user_id, "is_default": True},
+            {"$setOnInsert": new_portfolio},
+            projection={"_id": 0, "id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Two concurrent upserts can both insert; the one_default_portfolio index rejects the loser,
+        # which then reads the portfolio the winner created
+        portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True}, ID_FIELD)
+    return portfolio['id']
+
+async def move_cash(user_id: str, portfolio_id: str, currency: str, amount: float) -> float:
+    """Add amount (negative to take it out) to a portfolio's cash account, creating the account on first
+    use, in one atomic update; returns the new balance"""
+    now = utcnow()
+    account = await db.cash_accounts.find_one_and_update(
+        {"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency},
+        {"$inc": {"balance": amount}, "$set": {"updated_at": now}, "$setOnInsert": {"id": new_id(), "created_at": now}},
+        projection={"_id": 0, "balance": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return account['balance']
+
+def paged(cursor, skip: int, limit: Optional[int]):
+    """Apply optional skip/limit query params to a sorted cursor so pages are cut server-side"""
+    cursor = cursor.skip(skip)
+    return cursor.limit(limit) if limit is not None else cursor
+
+async def held_positions(user_id: str, portfolio_id: Optional[str] = None, projection: dict = POSITION_FIELDS) -> List[dict]:
+    """Current positions (quantity > 0) of a user, optionally limited to one portfolio"""
+    query = {"user_id": user_id, "quantity": {"$gt": 0}}
+    if portfolio_id:
+        query["portfolio_id"] = portfolio_id
+    return await db.positions.find(query, projection).to_list(None)
+
+async def market_ctx(user_id: str, portfolio_id: Optional[str] = None) -> MarketCtx:
+    positions, user_settings = await asyncio.gather(
+        held_positions(user_id, portfolio_id, NO_ID),
+        db.user_settings.find_one({"user_id": user_id}, SETTINGS_FIELDS)
+    )
+    risk_free_rate = user_settings.get('risk_free_rate', 3.0) if user_settings else 3.0
+    benchmark_index = user_settings.get('benchmark_index', '^GSPC') if user_settings else '^GSPC'
+    
+    # Fetch prices and per-position metrics (one batched history download) concurrently, off the event loop
+    symbols = [pos['symbol'] for pos in positions]
+    prices, metrics = await asyncio.gather(
+        asyncio.to_thread(yf_service.get_current_prices, symbols),
+        asyncio.to_thread(analytics_service.calculate_batch_metrics, symbols, market_index=benchmark_index)
+    )
+    return MarketCtx(positions, risk_free_rate, benchmark_index, prices, metrics)
+
 # Routes
 
 @api_router.get("/")
@@ -85,114 +335,48 @@ async def register(user_data: UserCreate):
     user = User(
         name=user_data.name,
         email=user_data.email,
-        password_hash=hash_password(user_data.password)
+        password_hash=await hash_password(user_data.password)
     )
     
-    await db.users.insert_one(user.dict())
+    try:
+        await db.users.insert_one(user.model_dump())
+    except DuplicateKeyError:
+        # A concurrent registration took the email between the check and the insert (unique index)
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    return UserResponse(id=user.id, name=user.name, email=user.email)
+    return model_json(UserResponse(id=user.id, name=user.name, email=user.email))
 
 @api_router.post("/auth/login", response_model=UserResponse)
 async def login(credentials: UserLogin):
     user = await get_user_by_email(credentials.email)
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    return UserResponse(id=user['id'], name=user['name'], email=user['email'])
+    return model_json(UserResponse(id=user['id'], name=user['name'], email=user['email']))
 
 # Positions
 @api_router.get("/positions")
-async def get_positions(user_id: str, portfolio_id: Optional[str] = None):
-    # Build query based on portfolio_id
-    query = {"user_id": user_id}
-    if portfolio_id:
-        query["portfolio_id"] = portfolio_id
-    
-    # Only get current positions (quantity > 0)
-    query["quantity"] = {"$gt": 0}
-    
-    positions = await db.positions.find(query).to_list(1000)
-    
-    # Get user's benchmark setting
-    user_settings = await db.user_settings.find_one({"user_id": user_id})
-    benchmark_index = user_settings.get('benchmark_index', '^GSPC') if user_settings else '^GSPC'
-    
-    # Enrich with current market data and metrics
-    enriched_positions = []
-    for pos in positions:
-        current_price = yf_service.get_current_price(pos['symbol'])
-        if current_price is None:
-            current_price = pos['avg_price']
-        
-        total_value = pos['quantity'] * current_price
-        invested = pos['quantity'] * pos['avg_price']
-        gain_loss = total_value - invested
-        gain_loss_percent = (gain_loss / invested * 100) if invested > 0 else 0
-        
-        # Calculate metrics using user's benchmark
-        beta = analytics_service.calculate_position_beta(pos['symbol'], market_index=benchmark_index)
-        volatility = analytics_service.calculate_position_volatility(pos['symbol'])
-        
-        # Create clean position dict without MongoDB _id
-        clean_pos = {k: v for k, v in pos.items() if k != '_id'}
-        # Convert datetime objects to ISO strings
-        if 'created_at' in clean_pos and hasattr(clean_pos['created_at'], 'isoformat'):
-            clean_pos['created_at'] = clean_pos['created_at'].isoformat()
-        if 'updated_at' in clean_pos and hasattr(clean_pos['updated_at'], 'isoformat'):
-            clean_pos['updated_at'] = clean_pos['updated_at'].isoformat()
-        if 'purchase_date' in clean_pos and hasattr(clean_pos['purchase_date'], 'isoformat'):
-            clean_pos['purchase_date'] = clean_pos['purchase_date'].isoformat()
-        
-        enriched_positions.append({
-            **clean_pos,
-            'current_price': round(current_price, 2),
-            'total_value': round(total_value, 2),
-            'invested': round(invested, 2),
-            'gain_loss': round(gain_loss, 2),
-            'gain_loss_percent': round(gain_loss_percent, 2),
-            'weight': 0,  # Will be calculated in portfolio summary
-            'beta': beta,
-            'volatility': volatility,
-            'last_update': datetime.utcnow().isoformat()
-        })
-    
-    # Calculate weights
-    total_portfolio_value = sum(p['total_value'] for p in enriched_positions)
-    if total_portfolio_value > 0:
-        for pos in enriched_positions:
-            pos['weight'] = round((pos['total_value'] / total_portfolio_value) * 100, 2)
-    
-    return enriched_positions
+async def get_positions(ctx: MarketCtx = Depends(market_ctx)):
+    return AppJSONResponse(_enrich_positions(ctx.positions, ctx.prices, ctx.metrics))
 
 @api_router.post("/positions")
-async def add_position(position_data: PositionCreate, user_id: str):
-    # Get ticker info to validate and get name
-    ticker_info = yf_service.get_ticker_info(position_data.symbol)
+async def add_position(user_id: str, position_data: PositionCreate):
+    # Get ticker info to validate and get name, looking up the default portfolio meanwhile if none was given
+    ticker_lookup = asyncio.to_thread(yf_service.get_ticker_info, position_data.symbol)
+    portfolio_id = position_data.portfolio_id
+    if portfolio_id:
+        ticker_info = await ticker_lookup
+    else:
+        ticker_info, portfolio_id = await asyncio.gather(ticker_lookup, default_portfolio_id(user_id))
     if not ticker_info:
         raise HTTPException(status_code=404, detail=f"Symbole {position_data.symbol} non trouvé")
     
     # Use provided purchase_date or default to now
-    transaction_date = position_data.purchase_date if position_data.purchase_date else datetime.utcnow()
+    transaction_date = position_data.purchase_date if position_data.purchase_date else utcnow()
     
-    # Get portfolio_id - use provided one or get the default portfolio
-    portfolio_id = position_data.portfolio_id
+    # No portfolio yet: create the default one now that the symbol is known to be valid
     if not portfolio_id:
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
-        if not default_portfolio:
-            first_portfolio = await db.portfolios.find_one({"user_id": user_id})
-            if first_portfolio:
-                portfolio_id = first_portfolio['id']
-            else:
-                new_portfolio = Portfolio(
-                    user_id=user_id,
-                    name="Portefeuille Principal",
-                    description="Mon portefeuille par défaut",
-                    is_default=True
-                )
-                await db.portfolios.insert_one(new_portfolio.dict())
-                portfolio_id = new_portfolio.id
-        else:
-            portfolio_id = default_portfolio['id']
+        portfolio_id = await ensure_default_portfolio_id(user_id)
     
     symbol_upper = position_data.symbol.upper()
     quantity = position_data.quantity
@@ -202,28 +386,26 @@ async def add_position(position_data: PositionCreate, user_id: str):
     cash_currency = position_data.cash_currency or "EUR"
     transaction_total = quantity * price
     
-    # Check if position already exists for this symbol in this portfolio
-    existing_position = await db.positions.find_one({
-        "user_id": user_id,
-        "portfolio_id": portfolio_id,
-        "symbol": symbol_upper
-    })
-    
     if transaction_type == "sell":
         # SELL TRANSACTION
-        if not existing_position:
-            raise HTTPException(status_code=400, detail=f"Vous ne détenez pas de position sur {symbol_upper}")
-        
-        old_quantity = existing_position['quantity']
-        
-        if quantity > old_quantity:
-            raise HTTPException(status_code=400, detail=f"Quantité insuffisante. Vous détenez {old_quantity} unités de {symbol_upper}")
+        # Check and decrement in one conditional write, so concurrent sells cannot take the quantity below zero
+        position_filter = {"user_id": user_id, "portfolio_id": portfolio_id, "symbol": symbol_upper}
+        sold_position = await db.positions.find_one_and_update(
+            {**position_filter, "quantity": {"$gte": quantity}},
+            {"$inc": {"quantity": -quantity}, "$set": {"updated_at": utcnow()}},
+            projection={"_id": 0, "id": 1, "quantity": 1, "avg_price": 1}
+        )
+        if not sold_position:
+            existing_position = await db.positions.find_one(position_filter, {"_id": 0, "quantity": 1})
+            if not existing_position:
+                raise HTTPException(status_code=400, detail=f"Vous ne détenez pas de position sur {symbol_upper}")
+            raise HTTPException(status_code=400, detail=f"Quantité insuffisante. Vous détenez {existing_position['quantity']} unités de {symbol_upper}")
         
-        new_quantity = old_quantity - quantity
+        new_quantity = sold_position['quantity'] - quantity
         sale_total = quantity * price
         
         # Create sell transaction with portfolio_id
-        transaction = Transaction(
+        transaction = Transaction.model_construct(
             user_id=user_id,
             symbol=symbol_upper,
             type="sell",
@@ -232,81 +414,58 @@ async def add_position(position_data: PositionCreate, user_id: str):
             total=sale_total,
             date=transaction_date
         )
-        transaction_dict = transaction.dict()
+        transaction_dict = transaction.model_dump()
         transaction_dict['portfolio_id'] = portfolio_id
-        await db.transactions.insert_one(transaction_dict)
         
         new_balance = 0
         # Update cash balance only if linked (selling adds money)
         if link_to_cash:
-            account = await db.cash_accounts.find_one({"user_id": user_id, "portfolio_id": portfolio_id, "currency": cash_currency})
-            current_balance = account['balance'] if account else 0.0
-            new_balance = current_balance + sale_total
-            
-            if account:
-                await db.cash_accounts.update_one(
-                    {"user_id": user_id, "portfolio_id": portfolio_id, "currency": cash_currency},
-                    {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-                )
-            else:
-                await db.cash_accounts.insert_one({
-                    "id": str(uuid.uuid4()),
-                    "user_id": user_id,
-                    "portfolio_id": portfolio_id,
-                    "currency": cash_currency,
-                    "balance": new_balance,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                })
+            account_write = move_cash(user_id, portfolio_id, cash_currency, sale_total)
             
             # Create automatic cash transaction for the sale
-            cash_transaction = CashTransaction(
+            cash_transaction = CashTransaction.model_construct(
                 user_id=user_id,
                 type="deposit",
                 amount=sale_total,
                 description=f"Vente {quantity} x {symbol_upper} à {price}€",
                 date=transaction_date
             )
-            cash_tx_dict = cash_transaction.dict()
+            cash_tx_dict = cash_transaction.model_dump()
             cash_tx_dict['currency'] = cash_currency
             cash_tx_dict['portfolio_id'] = portfolio_id
-            await db.cash_transactions.insert_one(cash_tx_dict)
+            # Balance and cash movement are independent writes: send them together
+            new_balance, _ = await asyncio.gather(account_write, db.cash_transactions.insert_one(cash_tx_dict))
         
         cash_msg = f" +{round(sale_total, 2)} {cash_currency} ajoutés au solde cash." if link_to_cash else ""
         
         if new_quantity <= 0:
-            # Position completely sold - delete it
-            await db.positions.delete_one({"id": existing_position['id']})
-            return {
-                "id": existing_position['id'],
+            # Position completely sold - delete it unless a concurrent buy refilled it (alongside the sell transaction insert)
+            await asyncio.gather(
+                db.positions.delete_one({"id": sold_position['id'], "quantity": {"$lte": 0}}),
+                db.transactions.insert_one(transaction_dict)
+            )
+            return AppJSONResponse({
+                "id": sold_position['id'],
                 "symbol": symbol_upper,
                 "quantity": 0,
                 "sale_total": round(sale_total, 2),
                 "new_cash_balance": round(new_balance, 2) if link_to_cash else None,
                 "currency": cash_currency if link_to_cash else None,
                 "message": f"Position {symbol_upper} entièrement vendue ({quantity} unités à {price}€).{cash_msg}"
-            }
+            })
         else:
-            # Partial sell - update quantity (PRU stays the same)
-            await db.positions.update_one(
-                {"id": existing_position['id']},
-                {
-                    "$set": {
-                        "quantity": new_quantity,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            return {
-                "id": existing_position['id'],
+            # Partial sell - quantity already decremented (PRU stays the same)
+            await db.transactions.insert_one(transaction_dict)
+            return AppJSONResponse({
+                "id": sold_position['id'],
                 "symbol": symbol_upper,
                 "quantity": new_quantity,
-                "avg_price": existing_position['avg_price'],
+                "avg_price": sold_position['avg_price'],
                 "sale_total": round(sale_total, 2),
                 "new_cash_balance": round(new_balance, 2) if link_to_cash else None,
                 "currency": cash_currency if link_to_cash else None,
                 "message": f"Vente partielle: {quantity} unités vendues à {price}€. Reste {new_quantity} unités.{cash_msg}"
-            }
+            })
     else:
         # BUY TRANSACTION
         buy_total = quantity * price
@@ -315,74 +474,71 @@ async def add_position(position_data: PositionCreate, user_id: str):
         new_balance = None
         cash_msg = ""
         if link_to_cash:
-            account = await db.cash_accounts.find_one({"user_id": user_id, "portfolio_id": portfolio_id, "currency": cash_currency})
-            current_balance = account['balance'] if account else 0.0
-            new_balance = current_balance - buy_total
-            
-            if account:
-                await db.cash_accounts.update_one(
-                    {"user_id": user_id, "portfolio_id": portfolio_id, "currency": cash_currency},
-                    {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-                )
-            else:
-                await db.cash_accounts.insert_one({
-                    "id": str(uuid.uuid4()),
-                    "user_id": user_id,
-                    "portfolio_id": portfolio_id,
-                    "currency": cash_currency,
-                    "balance": new_balance,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                })
+            account_write = move_cash(user_id, portfolio_id, cash_currency, -buy_total)
             
             # Create automatic cash transaction for the purchase
-            cash_transaction = CashTransaction(
+            cash_transaction = CashTransaction.model_construct(
                 user_id=user_id,
                 type="withdrawal",
                 amount=buy_total,
                 description=f"Achat {quantity} x {symbol_upper} à {price}€",
                 date=transaction_date
             )
-            cash_tx_dict = cash_transaction.dict()
+            cash_tx_dict = cash_transaction.model_dump()
             cash_tx_dict['currency'] = cash_currency
             cash_tx_dict['portfolio_id'] = portfolio_id
-            await db.cash_transactions.insert_one(cash_tx_dict)
+            # Balance and cash movement are independent writes: send them together
+            new_balance, _ = await asyncio.gather(account_write, db.cash_transactions.insert_one(cash_tx_dict))
             cash_msg = f" -{round(buy_total, 2)} {cash_currency} déduits du solde cash."
         
+        # Merge into the existing position of this portfolio or create it, in one atomic upsert:
+        # the pipeline computes the new quantity and weighted PRU from the stored values
+        position_id = new_id()
+        now = utcnow()
+        held = {"$ifNull": ["$quantity", 0]}
+        weighted_avg = {"$divide": [
+            {"$add": [{"$multiply": [held, {"$ifNull": ["$avg_price", 0]}]}, buy_total]},
+            {"$add": [held, quantity]}
+        ]}
+        position_write = db.positions.find_one_and_update(
+            {"user_id": user_id, "portfolio_id": portfolio_id, "symbol": symbol_upper},
+            [{"$set": {
+                "id": {"$ifNull": ["$id", position_id]},
+                "name": {"$ifNull": ["$name", {"$literal": ticker_info['name']}]},
+                "type": {"$ifNull": ["$type", position_data.type]},
+                "quantity": {"$add": [held, quantity]},
+                "avg_price": {"$cond": [{"$gt": [held, 0]}, {"$round": [weighted_avg, 4]}, price]},
+                "purchase_date": {"$ifNull": ["$purchase_date", transaction_date]},
+                "created_at": {"$ifNull": ["$created_at", now]},
+                "updated_at": now
+            }}],
+            projection={"_id": 0, "id": 1, "quantity": 1, "avg_price": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        
+        # Create buy transaction with portfolio_id
+        transaction = Transaction.model_construct(
+            user_id=user_id,
+            symbol=symbol_upper,
+            type="buy",
+            quantity=quantity,
+            price=price,
+            total=buy_total,
+            date=transaction_date
+        )
+        transaction_dict = transaction.model_dump()
+        transaction_dict['portfolio_id'] = portfolio_id
+        # Position upsert and transaction insert are independent: one round trip of latency
+        existing_position, _ = await asyncio.gather(position_write, db.transactions.insert_one(transaction_dict))
+        
         if existing_position:
-            # Merge with existing position
             old_quantity = existing_position['quantity']
             old_price = existing_position['avg_price']
-            
             total_quantity = old_quantity + quantity
             weighted_avg_price = ((old_quantity * old_price) + (quantity * price)) / total_quantity
             
-            await db.positions.update_one(
-                {"id": existing_position['id']},
-                {
-                    "$set": {
-                        "quantity": total_quantity,
-                        "avg_price": round(weighted_avg_price, 4),
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Create buy transaction with portfolio_id
-            transaction = Transaction(
-                user_id=user_id,
-                symbol=symbol_upper,
-                type="buy",
-                quantity=quantity,
-                price=price,
-                total=buy_total,
-                date=transaction_date
-            )
-            transaction_dict = transaction.dict()
-            transaction_dict['portfolio_id'] = portfolio_id
-            await db.transactions.insert_one(transaction_dict)
-            
-            return {
+            return AppJSONResponse({
                 "id": existing_position['id'],
                 "symbol": symbol_upper,
                 "quantity": total_quantity,
@@ -390,38 +546,10 @@ async def add_position(position_data: PositionCreate, user_id: str):
                 "new_cash_balance": round(new_balance, 2) if link_to_cash else None,
                 "currency": cash_currency if link_to_cash else None,
                 "message": f"Achat fusionné: {old_quantity} + {quantity} = {total_quantity} unités au PRU de {round(weighted_avg_price, 2)}€.{cash_msg}"
-            }
+            })
         else:
-            # Create new position
-            position = Position(
-                user_id=user_id,
-                portfolio_id=portfolio_id,
-                symbol=symbol_upper,
-                name=ticker_info['name'],
-                type=position_data.type,
-                quantity=quantity,
-                avg_price=price,
-                purchase_date=transaction_date
-            )
-            
-            await db.positions.insert_one(position.dict())
-            
-            # Create buy transaction with portfolio_id
-            transaction = Transaction(
-                user_id=user_id,
-                symbol=symbol_upper,
-                type="buy",
-                quantity=quantity,
-                price=price,
-                total=buy_total,
-                date=transaction_date
-            )
-            transaction_dict = transaction.dict()
-            transaction_dict['portfolio_id'] = portfolio_id
-            await db.transactions.insert_one(transaction_dict)
-            
-            return {
-                "id": position.id,
+            return AppJSONResponse({
+                "id": position_id,
                 "symbol": symbol_upper,
                 "quantity": quantity,
                 "avg_price": price,
@@ -429,7 +557,7 @@ async def add_position(position_data: PositionCreate, user_id: str):
                 "new_cash_balance": round(new_balance, 2) if link_to_cash else None,
                 "currency": cash_currency if link_to_cash else None,
                 "message": f"Nouvelle position créée: {quantity} unités de {symbol_upper} à {price}€.{cash_msg}"
-            }
+            })
 
 @api_router.delete("/positions/{position_id}")
 async def delete_position(position_id: str, user_id: str):
@@ -438,11 +566,19 @@ async def delete_position(position_id: str, user_id: str):
         raise HTTPException(status_code=404, detail="Position not found")
     return {"message": "Position deleted successfully"}
 
+@api_router.post("/positions/bulk-delete")
+async def delete_positions(user_id: str, ids: BulkIds):
+    """Delete several positions in one round trip instead of one DELETE per position"""
+    result = await db.positions.delete_many({"id": {"$in": ids}, "user_id": user_id})
+    return {"deleted": result.deleted_count, "message": f"{result.deleted_count} position(s) supprimée(s)"}
+
 # Merge duplicate positions utility endpoint
 @api_router.post("/positions/merge-duplicates")
 async def merge_duplicate_positions(user_id: str):
     """Merge all duplicate positions (same symbol) into single positions with weighted average price"""
-    positions = await db.positions.find({"user_id": user_id}).to_list(1000)
+    positions = await db.positions.find(
+        {"user_id": user_id}, {"_id": 0, "id": 1, "portfolio_id": 1, "symbol": 1, "quantity": 1, "avg_price": 1}
+    ).to_list(None)
     
     if not positions:
         return {"message": "Aucune position trouvée", "merged": 0}
@@ -455,8 +591,10 @@ async def merge_duplicate_positions(user_id: str):
             position_groups[key] = []
         position_groups[key].append(pos)
     
-    merged_count = 0
-    
+    # One update per group plus a single delete for every duplicate, sent in one bulk write
+    operations = []
+    duplicate_ids = []
+    updated_at = utcnow()
     for key, group in position_groups.items():
         if len(group) > 1:
             # Multiple positions for same symbol - merge them
@@ -465,21 +603,24 @@ async def merge_duplicate_positions(user_id: str):
             
             # Keep the first position and update it
             main_position = group[0]
-            await db.positions.update_one(
+            operations.append(UpdateOne(
                 {"id": main_position['id']},
                 {
                     "$set": {
                         "quantity": total_quantity,
                         "avg_price": round(weighted_avg, 4),
-                        "updated_at": datetime.utcnow()
+                        "updated_at": updated_at
                     }
                 }
-            )
+            ))
             
             # Delete the other duplicate positions
-            for pos in group[1:]:
-                await db.positions.delete_one({"id": pos['id']})
-                merged_count += 1
+            duplicate_ids.extend(pos['id'] for pos in group[1:])
+    
+    merged_count = len(duplicate_ids)
+    if operations:
+        operations.append(DeleteMany({"id": {"$in": duplicate_ids}, "user_id": user_id}))
+        await db.positions.bulk_write(operations, ordered=False)
     
     return {
         "message": f"{merged_count} positions en doublon fusionnées",
@@ -497,11 +638,27 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
     # Only get current positions (quantity > 0)
     query["quantity"] = {"$gt": 0}
     
-    # Get positions
-    positions = await db.positions.find(query).to_list(1000)
-    
-    # Get user settings for RFR and benchmark
-    user_settings = await db.user_settings.find_one({"user_id": user_id})
+    # Let MongoDB compute the invested total and first purchase date, returning only the
+    # position fields the summary needs; fetch user settings (RFR and benchmark) alongside
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "invested": {"$sum": {"$multiply": ["$quantity", "$avg_price"]}},
+            "first_purchase_date": {"$min": "$purchase_date"},
+            "positions": {"$push": {
+                "symbol": "$symbol",
+                "quantity": "$quantity",
+                "avg_price": "$avg_price",
+                "purchase_date": "$purchase_date"
+            }}
+        }}
+    ]
+    aggregated, user_settings = await asyncio.gather(
+        db.positions.aggregate(pipeline).to_list(1),
+        db.user_settings.find_one({"user_id": user_id}, SETTINGS_FIELDS)
+    )
+    positions = aggregated[0]['positions'] if aggregated else []
     risk_free_rate = user_settings.get('risk_free_rate', 3.0) if user_settings else 3.0
     benchmark_index = user_settings.get('benchmark_index', '^GSPC') if user_settings else '^GSPC'
     
@@ -510,28 +667,16 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
         cash_query = {"user_id": user_id}
         if portfolio_id:
             cash_query["portfolio_id"] = portfolio_id
-        cash_accounts = await db.cash_accounts.find(cash_query).to_list(100)
+        cash_accounts = await db.cash_accounts.find(cash_query, NO_ID).to_list(None)
         
-        # Convert all cash to EUR
-        total_cash_eur = 0.0
-        cash_details = []
-        for acc in cash_accounts:
-            currency = acc.get('currency', 'EUR')
-            balance = acc.get('balance', 0)
-            if balance != 0:
-                balance_in_eur = yf_service.convert_to_eur(balance, currency)
-                total_cash_eur += balance_in_eur
-                cash_details.append({
-                    'currency': currency,
-                    'balance': balance,
-                    'balance_eur': round(balance_in_eur, 2)
-                })
+        # Convert all cash to EUR (exchange rates may hit Yahoo: keep it off the event loop)
+        total_cash_eur, cash_details = await asyncio.to_thread(_cash_in_eur, cash_accounts)
         
         # Get capital contributions
         capital_query = {"user_id": user_id}
         if portfolio_id:
             capital_query["portfolio_id"] = portfolio_id
-        contributions = await db.capital_contributions.find(capital_query).to_list(1000)
+        contributions = await db.capital_contributions.find(capital_query, CONTRIBUTION_FIELDS).to_list(None)
         total_deposits = sum(c['amount'] for c in contributions if c['type'] == 'deposit')
         total_withdrawals = sum(c['amount'] for c in contributions if c['type'] == 'withdrawal')
         net_capital = total_deposits - total_withdrawals
@@ -539,7 +684,7 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
         capital_gain_loss = total_cash_eur - net_capital if net_capital > 0 else 0
         capital_performance_percent = (capital_gain_loss / net_capital * 100) if net_capital > 0 else 0
         
-        return {
+        return AppJSONResponse({
             "total_value": round(total_cash_eur, 2),
             "positions_value": 0,
             "cash_value": round(total_cash_eur, 2),
@@ -560,102 +705,59 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
             "capital_gain_loss": round(capital_gain_loss, 2),
             "capital_performance_percent": round(capital_performance_percent, 2),
             "portfolio_id": portfolio_id
-        }
+        })
     
     # Calculate portfolio metrics
-    total_value = 0
-    total_invested = 0
-    enriched_positions = []
-    earliest_purchase_date = None
+    total_invested = aggregated[0]['invested']
+    earliest_purchase_date = aggregated[0]['first_purchase_date']
     
-    for pos in positions:
-        current_price = yf_service.get_current_price(pos['symbol'])
-        if current_price is None:
-            current_price = pos['avg_price']
-        
-        position_value = pos['quantity'] * current_price
-        position_invested = pos['quantity'] * pos['avg_price']
-        
-        total_value += position_value
-        total_invested += position_invested
-        
-        # Track earliest purchase date
-        purchase_date = pos.get('purchase_date')
-        if purchase_date:
-            if earliest_purchase_date is None or purchase_date < earliest_purchase_date:
-                earliest_purchase_date = purchase_date
-        
-        enriched_positions.append({
-            'symbol': pos['symbol'],
-            'total_value': position_value,
-            'invested': position_invested,
-            'quantity': pos['quantity'],
-            'purchase_date': pos.get('purchase_date')
-        })
+    prices = await asyncio.to_thread(yf_service.get_current_prices, [pos['symbol'] for pos in positions])
+    summary = _summarize(positions, prices)
+    total_value = summary['total_value']
+    enriched_positions = summary['positions']
     
     total_gain_loss = total_value - total_invested
     gain_loss_percent = (total_gain_loss / total_invested * 100) if total_invested > 0 else 0
     
-    # Calculate volatility (historical and realized)
-    volatility = analytics_service.calculate_portfolio_volatility(enriched_positions)
-    realized_volatility = analytics_service.calculate_realized_volatility(enriched_positions)
+    # Volatility (historical and realized), beta vs user's benchmark, Sharpe with user's RFR
+    # and the batched daily changes are independent: run them concurrently in worker threads
+    volatility, realized_volatility, beta, sharpe_ratio, changes = await asyncio.gather(
+        asyncio.to_thread(analytics_service.calculate_portfolio_volatility, enriched_positions),
+        asyncio.to_thread(analytics_service.calculate_realized_volatility, enriched_positions),
+        asyncio.to_thread(analytics_service.calculate_portfolio_beta, enriched_positions, market_index=benchmark_index),
+        asyncio.to_thread(analytics_service.calculate_sharpe_ratio_custom, enriched_positions, risk_free_rate),
+        asyncio.to_thread(yf_service.get_daily_changes, [pos['symbol'] for pos in positions])
+    )
     volatility['realized'] = realized_volatility
     
-    # Calculate beta using user's benchmark
-    beta = analytics_service.calculate_portfolio_beta(enriched_positions, market_index=benchmark_index)
-    
-    # Calculate Sharpe ratio with user's RFR
-    sharpe_ratio = analytics_service.calculate_sharpe_ratio_custom(enriched_positions, risk_free_rate)
-    
     # Calculate daily change
-    daily_change = 0
-    daily_change_percent = 0
-    for pos in positions:
-        change = yf_service.get_daily_change(pos['symbol'])
-        if change:
-            position_value = pos['quantity'] * (change.get('current_price', pos['avg_price']))
-            weight = position_value / total_value if total_value > 0 else 0
-            daily_change += pos['quantity'] * change.get('price_change', 0)
-            daily_change_percent += weight * change.get('change_percent', 0)
+    daily_change, daily_change_percent = analytics_service.calculate_daily_change(positions, changes, total_value)
     
     # Calculate holding period
     holding_period_days = 0
     if earliest_purchase_date:
-        if hasattr(earliest_purchase_date, 'replace'):
-            earliest_purchase_date = earliest_purchase_date.replace(tzinfo=None)
-        holding_period_days = (datetime.utcnow() - earliest_purchase_date).days
+        holding_period_days = (utcnow() - earliest_purchase_date).days
     
     # Get capital contributions for this specific portfolio
     capital_query = {"user_id": user_id}
     if portfolio_id:
         capital_query["portfolio_id"] = portfolio_id
     
-    contributions = await db.capital_contributions.find(capital_query).to_list(1000)
-    total_deposits = sum(c['amount'] for c in contributions if c['type'] == 'deposit')
-    total_withdrawals = sum(c['amount'] for c in contributions if c['type'] == 'withdrawal')
-    net_capital = total_deposits - total_withdrawals
-    
     # Get cash accounts for this portfolio and convert all to EUR
     cash_query = {"user_id": user_id}
     if portfolio_id:
         cash_query["portfolio_id"] = portfolio_id
     
-    cash_accounts = await db.cash_accounts.find(cash_query).to_list(100)
+    contributions, cash_accounts = await asyncio.gather(
+        db.capital_contributions.find(capital_query, CONTRIBUTION_FIELDS).to_list(None),
+        db.cash_accounts.find(cash_query, NO_ID).to_list(None)
+    )
+    total_deposits = sum(c['amount'] for c in contributions if c['type'] == 'deposit')
+    total_withdrawals = sum(c['amount'] for c in contributions if c['type'] == 'withdrawal')
+    net_capital = total_deposits - total_withdrawals
     
-    # Convert all cash to EUR for accurate total
-    total_cash_eur = 0.0
-    cash_details = []
-    for acc in cash_accounts:
-        currency = acc.get('currency', 'EUR')
-        balance = acc.get('balance', 0)
-        if balance != 0:
-            balance_in_eur = yf_service.convert_to_eur(balance, currency)
-            total_cash_eur += balance_in_eur
-            cash_details.append({
-                'currency': currency,
-                'balance': balance,
-                'balance_eur': round(balance_in_eur, 2)
-            })
+    # Convert all cash to EUR for accurate total (exchange rates may hit Yahoo: keep it off the event loop)
+    total_cash_eur, cash_details = await asyncio.to_thread(_cash_in_eur, cash_accounts)
     
     # Total value includes positions + cash (all in EUR)
     total_value_with_cash = total_value + total_cash_eur
@@ -664,7 +766,7 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
     capital_gain_loss = total_value_with_cash - net_capital if net_capital > 0 else 0
     capital_performance_percent = (capital_gain_loss / net_capital * 100) if net_capital > 0 else 0
     
-    return {
+    return AppJSONResponse({
         "total_value": round(total_value_with_cash, 2),
         "positions_value": round(total_value, 2),
         "cash_value": round(total_cash_eur, 2),
@@ -680,151 +782,162 @@ async def get_portfolio_summary(user_id: str, portfolio_id: Optional[str] = None
         "risk_free_rate": risk_free_rate,
         "benchmark_index": benchmark_index,
         "holding_period_days": holding_period_days,
-        "first_purchase_date": earliest_purchase_date.isoformat() if earliest_purchase_date else None,
+        "first_purchase_date": earliest_purchase_date,
         "net_capital": round(net_capital, 2),
         "capital_gain_loss": round(capital_gain_loss, 2),
         "capital_performance_percent": round(capital_performance_percent, 2),
         "portfolio_id": portfolio_id
-    }
+    })
 
 # Analytics
 @api_router.get("/analytics/correlation")
-async def get_correlation_matrix(user_id: str):
+async def get_correlation_matrix(user_id: str, request: Request):
     # Only get positions with quantity > 0 (current positions, not sold ones)
-    positions = await db.positions.find({
-        "user_id": user_id,
-        "quantity": {"$gt": 0}
-    }).to_list(1000)
+    positions = await held_positions(user_id)
     
     if len(positions) < 2:
         return []
     
     symbols = [pos['symbol'] for pos in positions]
-    correlations = analytics_service.calculate_correlation_matrix(symbols)
+    correlations = await asyncio.to_thread(analytics_service.calculate_correlation_matrix, symbols)
     
-    return correlations
+    # The matrix changes as soon as the user trades, so the browser revalidates it by ETag on every request
+    # (304 when unchanged); computed matrices stay in the analytics metrics cache server-side
+    return cacheable_json(request, correlations, max_age=0, private=True)
 
 @api_router.get("/analytics/recommendations")
-async def get_recommendations(user_id: str):
-    # Get positions
-    positions_data = await get_positions(user_id)
+async def get_recommendations(ctx: MarketCtx = Depends(market_ctx)):
+    if not ctx.positions:
+        return AppJSONResponse(analytics_service.generate_recommendations([], {'beta': 1.0, 'sharpe_ratio': 0}))
     
-    # Get portfolio summary
-    summary_data = await get_portfolio_summary(user_id)
+    # Positions, settings, prices and metrics come from the request-scoped market context
+    positions_data = _enrich_positions(ctx.positions, ctx.prices, ctx.metrics)
+    summary_positions = _summarize(ctx.positions, ctx.prices)['positions']
+    
+    beta, sharpe_ratio = await asyncio.gather(
+        asyncio.to_thread(analytics_service.calculate_portfolio_beta, summary_positions, market_index=ctx.benchmark_index),
+        asyncio.to_thread(analytics_service.calculate_sharpe_ratio_custom, summary_positions, ctx.risk_free_rate)
+    )
     
-    # Generate recommendations (summary_data is already a dict)
     recommendations = analytics_service.generate_recommendations(
         positions_data,
-        summary_data
+        {'beta': beta, 'sharpe_ratio': sharpe_ratio}
     )
     
-    return recommendations
+    return AppJSONResponse(recommendations)
 
 # Transactions
 @api_router.get("/transactions")
-async def get_transactions(user_id: str):
-    transactions = await db.transactions.find({"user_id": user_id}).sort("date", -1).to_list(1000)
-    
-    # Clean transactions to remove MongoDB _id and convert datetime
-    clean_transactions = []
-    for txn in transactions:
-        clean_txn = {k: v for k, v in txn.items() if k != '_id'}
-        # Convert datetime objects to ISO strings
-        if 'date' in clean_txn:
-            clean_txn['date'] = clean_txn['date'].isoformat()
-        clean_transactions.append(clean_txn)
-    
-    return clean_transactions
+async def get_transactions(user_id: str, skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    # Newest first, served by the (user_id, date) index; skip/limit page through it server-side
+    cursor = paged(db.transactions.find({"user_id": user_id}, NO_ID).sort("date", -1), skip, limit)
+    # Stream documents as the driver fetches them instead of materializing the whole history first;
+    # they go out as stored, so legacy entries gain neither a made-up date nor a null portfolio_id
+    return json_stream(cursor)
 
 # Market data
 @api_router.get("/market/quote/{symbol}")
-async def get_market_quote(symbol: str):
-    quote = yf_service.get_ticker_info(symbol)
+async def get_market_quote(symbol: str, request: Request):
+    # Quotes carry live price fields, so only reuse very recent info (server- and client-side)
+    quote = await asyncio.to_thread(yf_service.get_ticker_info, symbol, max_age=PRICE_CACHE_DURATION)
     if not quote:
         raise HTTPException(status_code=404, detail=f"Symbol {symbol} not found")
-    return quote
+    return cacheable_json(request, quote, max_age=PRICE_CACHE_DURATION)
+
+@api_router.post("/admin/cache/invalidate/{symbol}", dependencies=[Depends(require_admin)])
+async def invalidate_symbol_cache(symbol: str):
+    """Drop every cached quote, history, metric and sector entry for a symbol so the next request refetches it"""
+    symbol = symbol.upper()
+    removed = (
+        yf_service.invalidate_symbol(symbol)
+        + analytics_service.invalidate_symbol(symbol)
+        + sector_service.invalidate_symbol(symbol)
+    )
+    return {"symbol": symbol, "removed": removed}
 
 @api_router.get("/market/search")
 async def search_market(q: str):
-    results = yf_service.search_ticker(q)
+    results = await asyncio.to_thread(yf_service.search_ticker, q)
     return results
 
 # Performance endpoints
-@api_router.get("/analytics/performance")
-async def get_performance(user_id: str, period: str = 'all', symbol: Optional[str] = None):
+@api_router.get(
+    "/analytics/performance",
+    responses={200: {"model": PerformanceResponse | PerformanceResponseCompact}}
+)
+async def get_performance(user_id: str, period: str = 'all', symbol: Optional[str] = None, compact: bool = False):
     """
     Get performance data for portfolio or specific position
     period: 'all', 'ytd', '1m', '3m', '6m', '1y'
+    compact: return parallel dates/values/change_percents arrays (PerformanceResponseCompact)
+    instead of the default list of rows (PerformanceResponse)
     """
     if symbol:
         # Get position data
-        position = await db.positions.find_one({"user_id": user_id, "symbol": symbol})
+        position = await db.positions.find_one({"user_id": user_id, "symbol": symbol}, POSITION_FIELDS)
         if not position:
             raise HTTPException(status_code=404, detail="Position not found")
         
-        perf_data = performance_service.calculate_position_performance(
+        perf_data = await asyncio.to_thread(
+            performance_service.calculate_position_performance,
             symbol=position['symbol'],
             quantity=position['quantity'],
             purchase_price=position['avg_price'],
-            purchase_date=position.get('purchase_date', datetime.utcnow()),
-            period=period
+            purchase_date=position.get('purchase_date', utcnow()),
+            period=period,
+            compact=compact
         )
         
-        return {
+        return AppJSONResponse({
             'symbol': symbol,
             'period': period,
             **perf_data
-        }
+        })
     else:
         # Get portfolio performance - only current positions
-        positions = await db.positions.find({
-            "user_id": user_id,
-            "quantity": {"$gt": 0}
-        }).to_list(1000)
+        positions = await held_positions(user_id)
         
         if not positions:
-            return {
+            return AppJSONResponse({
                 'symbol': None,
                 'period': period,
-                'data': [],
-                'total_return': 0,
-                'total_return_percent': 0
-            }
+                **PerformanceService.empty_performance(compact)
+            })
         
         # Enrich positions with current prices
+        prices = await asyncio.to_thread(yf_service.get_current_prices, [pos['symbol'] for pos in positions])
         enriched_positions = []
         for pos in positions:
-            current_price = yf_service.get_current_price(pos['symbol'])
+            current_price = prices.get(pos['symbol'])
             if current_price:
                 enriched_positions.append({
                     'symbol': pos['symbol'],
                     'quantity': pos['quantity'],
                     'avg_price': pos['avg_price'],
-                    'purchase_date': pos.get('purchase_date', datetime.utcnow())
+                    'purchase_date': pos.get('purchase_date', utcnow())
                 })
         
-        perf_data = performance_service.calculate_portfolio_performance(
+        perf_data = await asyncio.to_thread(
+            performance_service.calculate_portfolio_performance,
             enriched_positions,
-            period=period
+            period=period,
+            compact=compact
         )
         
-        return {
+        return AppJSONResponse({
             'symbol': None,
             'period': period,
             **perf_data
-        }
+        })
 
 @api_router.get("/analytics/compare-index")
 async def compare_with_index(user_id: str, period: str = 'ytd', index: str = '^GSPC'):
     """Compare portfolio performance with market index"""
     # Get portfolio performance - only current positions
-    positions = await db.positions.find({
-        "user_id": user_id,
-        "quantity": {"$gt": 0}
-    }).to_list(1000)
+    positions = await held_positions(user_id)
     
     if not positions:
-        return {'data': []}
+        return AppJSONResponse({'data': []})
     
     enriched_positions = []
     for pos in positions:
@@ -832,31 +945,29 @@ async def compare_with_index(user_id: str, period: str = 'ytd', index: str = '^G
             'symbol': pos['symbol'],
             'quantity': pos['quantity'],
             'avg_price': pos['avg_price'],
-            'purchase_date': pos.get('purchase_date', datetime.utcnow())
+            'purchase_date': pos.get('purchase_date', utcnow())
         })
     
-    perf_data = performance_service.calculate_portfolio_performance(enriched_positions, period=period)
-    comparison = performance_service.compare_with_index(perf_data['data'], index)
+    perf_data = await asyncio.to_thread(performance_service.calculate_portfolio_performance, enriched_positions, period=period)
+    comparison = await asyncio.to_thread(performance_service.compare_with_index, perf_data['data'], index)
     
-    return comparison
+    return AppJSONResponse(comparison)
 
 # Sector analysis
 @api_router.get("/analytics/sector-distribution")
 async def get_sector_distribution(user_id: str):
     """Get sector distribution of portfolio"""
     # Only current positions
-    positions = await db.positions.find({
-        "user_id": user_id,
-        "quantity": {"$gt": 0}
-    }).to_list(1000)
+    positions = await held_positions(user_id)
     
     if not positions:
-        return []
+        return AppJSONResponse([])
     
     # Enrich with current prices
+    prices = await asyncio.to_thread(yf_service.get_current_prices, [pos['symbol'] for pos in positions])
     enriched_positions = []
     for pos in positions:
-        current_price = yf_service.get_current_price(pos['symbol'])
+        current_price = prices.get(pos['symbol'])
         if current_price:
             total_value = pos['quantity'] * current_price
             enriched_positions.append({
@@ -865,19 +976,19 @@ async def get_sector_distribution(user_id: str):
                 'total_value': total_value
             })
     
-    distribution = sector_service.calculate_sector_distribution(enriched_positions)
-    return distribution
+    distribution = await asyncio.to_thread(sector_service.calculate_sector_distribution, enriched_positions)
+    return AppJSONResponse(distribution)
 
 # Dividends endpoints
 @api_router.get("/dividends")
-async def get_dividends(user_id: str):
-    dividends = await db.dividends.find({"user_id": user_id}).sort("date", -1).to_list(1000)
-    return dividends
+async def get_dividends(user_id: str, skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    dividends = await paged(db.dividends.find({"user_id": user_id}, NO_ID).sort("date", -1), skip, limit).to_list(None)
+    return json_list(DIVIDEND_LIST_ADAPTER, [Dividend.from_db(d) for d in dividends])
 
-@api_router.post("/dividends")
-async def add_dividend(dividend_data: DividendCreate, user_id: str):
+@api_router.post("/dividends", response_model=Dividend)
+async def add_dividend(user_id: str, dividend_data: DividendCreate):
     # Get position
-    position = await db.positions.find_one({"id": dividend_data.position_id, "user_id": user_id})
+    position = await db.positions.find_one({"id": dividend_data.position_id, "user_id": user_id}, {"_id": 0, "symbol": 1})
     if not position:
         raise HTTPException(status_code=404, detail="Position not found")
     
@@ -890,8 +1001,8 @@ async def add_dividend(dividend_data: DividendCreate, user_id: str):
         notes=dividend_data.notes
     )
     
-    await db.dividends.insert_one(dividend.dict())
-    return dividend
+    await db.dividends.insert_one(dividend.model_dump())
+    return model_json(dividend)
 
 @api_router.delete("/dividends/{dividend_id}")
 async def delete_dividend(dividend_id: str, user_id: str):
@@ -902,40 +1013,19 @@ async def delete_dividend(dividend_id: str, user_id: str):
 
 # Alerts endpoints
 @api_router.get("/alerts")
-async def get_alerts(user_id: str):
-    alerts = await db.alerts.find({"user_id": user_id}).sort("created_at", -1).to_list(1000)
-    
-    # Clean MongoDB _id and convert dates
-    clean_alerts = []
-    for alert in alerts:
-        clean_alert = {k: v for k, v in alert.items() if k != '_id'}
-        if 'created_at' in clean_alert and hasattr(clean_alert['created_at'], 'isoformat'):
-            clean_alert['created_at'] = clean_alert['created_at'].isoformat()
-        if 'triggered_at' in clean_alert and clean_alert['triggered_at'] and hasattr(clean_alert['triggered_at'], 'isoformat'):
-            clean_alert['triggered_at'] = clean_alert['triggered_at'].isoformat()
-        clean_alerts.append(clean_alert)
-    
-    return clean_alerts
+async def get_alerts(user_id: str, skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    alerts = await paged(db.alerts.find({"user_id": user_id}, NO_ID).sort("created_at", -1), skip, limit).to_list(None)
+    return json_list(ALERT_LIST_ADAPTER, [Alert.from_db(a) for a in alerts])
 
 @api_router.get("/alerts/triggered")
 async def get_triggered_alerts(user_id: str):
     """Get alerts that have been triggered but not yet acknowledged"""
-    alerts = await db.alerts.find({
+    # Streamed as stored, like the other raw-document lists
+    return json_stream(db.alerts.find({
         "user_id": user_id,
         "is_triggered": True,
         "is_acknowledged": False
-    }).to_list(1000)
-    
-    clean_alerts = []
-    for alert in alerts:
-        clean_alert = {k: v for k, v in alert.items() if k != '_id'}
-        if 'created_at' in clean_alert and hasattr(clean_alert['created_at'], 'isoformat'):
-            clean_alert['created_at'] = clean_alert['created_at'].isoformat()
-        if 'triggered_at' in clean_alert and clean_alert['triggered_at'] and hasattr(clean_alert['triggered_at'], 'isoformat'):
-            clean_alert['triggered_at'] = clean_alert['triggered_at'].isoformat()
-        clean_alerts.append(clean_alert)
-    
-    return clean_alerts
+    }, NO_ID))
 
 @api_router.get("/alerts/check")
 async def check_alerts(user_id: str):
@@ -944,13 +1034,14 @@ async def check_alerts(user_id: str):
         "user_id": user_id,
         "is_active": True,
         "is_triggered": False
-    }).to_list(1000)
+    }, NO_ID).to_list(None)
     
     triggered_alerts = []
+    prices = await asyncio.to_thread(yf_service.get_current_prices, [alert['symbol'] for alert in alerts])
     
     for alert in alerts:
         symbol = alert['symbol']
-        current_price = yf_service.get_current_price(symbol)
+        current_price = prices.get(symbol)
         
         if current_price is None:
             continue
@@ -969,7 +1060,7 @@ async def check_alerts(user_id: str):
                 {
                     "$set": {
                         "is_triggered": True,
-                        "triggered_at": datetime.utcnow(),
+                        "triggered_at": utcnow(),
                         "triggered_price": current_price
                     }
                 }
@@ -990,14 +1081,15 @@ async def check_alerts(user_id: str):
     }
 
 @api_router.post("/alerts")
-async def create_alert(alert_data: AlertCreate, user_id: str):
-    # Validate symbol
-    ticker_info = yf_service.get_ticker_info(alert_data.symbol)
+async def create_alert(user_id: str, alert_data: AlertCreate):
+    # Validate symbol and fetch its price concurrently
+    ticker_info, current_price = await asyncio.gather(
+        asyncio.to_thread(yf_service.get_ticker_info, alert_data.symbol),
+        asyncio.to_thread(yf_service.get_current_price, alert_data.symbol)
+    )
     if not ticker_info:
         raise HTTPException(status_code=404, detail=f"Symbole {alert_data.symbol} non trouvé")
     
-    current_price = yf_service.get_current_price(alert_data.symbol)
-    
     alert = Alert(
         user_id=user_id,
         symbol=alert_data.symbol.upper(),
@@ -1006,10 +1098,10 @@ async def create_alert(alert_data: AlertCreate, user_id: str):
         notes=alert_data.notes
     )
     
-    await db.alerts.insert_one(alert.dict())
+    await db.alerts.insert_one(alert.model_dump())
     
     return {
-        **alert.dict(),
+        **alert.model_dump(),
         "current_price": current_price,
         "symbol_name": ticker_info['name']
     }
@@ -1025,6 +1117,15 @@ async def acknowledge_alert(alert_id: str, user_id: str):
         raise HTTPException(status_code=404, detail="Alerte non trouvée")
     return {"message": "Alerte acquittée"}
 
+@api_router.post("/alerts/bulk-acknowledge")
+async def acknowledge_alerts(user_id: str, ids: BulkIds):
+    """Acknowledge several alerts in one round trip"""
+    result = await db.alerts.update_many(
+        {"id": {"$in": ids}, "user_id": user_id},
+        {"$set": {"is_acknowledged": True}}
+    )
+    return {"acknowledged": result.modified_count, "message": f"{result.modified_count} alerte(s) acquittée(s)"}
+
 @api_router.put("/alerts/{alert_id}/reactivate")
 async def reactivate_alert(alert_id: str, user_id: str):
     """Reactivate an alert (reset triggered state)"""
@@ -1063,11 +1164,11 @@ async def delete_alert(alert_id: str, user_id: str):
 # Goals endpoints
 @api_router.get("/goals")
 async def get_goals(user_id: str):
-    goals = await db.goals.find({"user_id": user_id}).to_list(1000)
-    return goals
+    goals = await db.goals.find({"user_id": user_id}, NO_ID).to_list(None)
+    return json_list(GOAL_LIST_ADAPTER, [Goal.from_db(g) for g in goals])
 
-@api_router.post("/goals")
-async def create_goal(goal_data: GoalCreate, user_id: str):
+@api_router.post("/goals", response_model=Goal)
+async def create_goal(user_id: str, goal_data: GoalCreate):
     goal = Goal(
         user_id=user_id,
         title=goal_data.title,
@@ -1076,8 +1177,8 @@ async def create_goal(goal_data: GoalCreate, user_id: str):
         description=goal_data.description
     )
     
-    await db.goals.insert_one(goal.dict())
-    return goal
+    await db.goals.insert_one(goal.model_dump())
+    return model_json(goal)
 
 @api_router.put("/goals/{goal_id}")
 async def update_goal(goal_id: str, user_id: str, is_completed: bool):
@@ -1100,7 +1201,7 @@ async def delete_goal(goal_id: str, user_id: str):
 @api_router.get("/position-note/{position_id}")
 async def get_position_note(position_id: str, user_id: str):
     """Get the single note for a position"""
-    note = await db.position_notes.find_one({"position_id": position_id, "user_id": user_id})
+    note = await db.position_notes.find_one({"position_id": position_id, "user_id": user_id}, {"_id": 0, "content": 1, "updated_at": 1})
     if note:
         return {"content": note.get("content", ""), "updated_at": note.get("updated_at")}
     return {"content": "", "updated_at": None}
@@ -1113,12 +1214,12 @@ async def save_position_note(position_id: str, user_id: str, content: str = ""):
         {
             "$set": {
                 "content": content,
-                "updated_at": datetime.utcnow()
+                "updated_at": utcnow()
             },
             "$setOnInsert": {
                 "position_id": position_id,
                 "user_id": user_id,
-                "created_at": datetime.utcnow()
+                "created_at": utcnow()
             }
         },
         upsert=True
@@ -1134,25 +1235,26 @@ async def delete_position_note(position_id: str, user_id: str):
 # Legacy Notes endpoints (keeping for backward compatibility)
 @api_router.get("/notes/{position_id}")
 async def get_notes(position_id: str, user_id: str):
-    notes = await db.notes.find({"position_id": position_id, "user_id": user_id}).to_list(1000)
-    return notes
+    notes = await db.notes.find({"position_id": position_id, "user_id": user_id}, NO_ID).to_list(None)
+    return json_list(NOTE_LIST_ADAPTER, [Note.from_db(n) for n in notes])
 
-@api_router.post("/notes")
-async def create_note(note_data: NoteCreate, user_id: str):
+@api_router.post("/notes", response_model=Note)
+async def create_note(user_id: str, note_data: NoteCreate):
     note = Note(
         user_id=user_id,
         position_id=note_data.position_id,
         content=note_data.content
     )
     
-    await db.notes.insert_one(note.dict())
-    return note
+    await db.notes.insert_one(note.model_dump())
+    # Records are dataclasses, which orjson encodes natively
+    return AppJSONResponse(note)
 
 @api_router.put("/notes/{note_id}")
 async def update_note(note_id: str, user_id: str, content: str):
     result = await db.notes.update_one(
         {"id": note_id, "user_id": user_id},
-        {"$set": {"content": content, "updated_at": datetime.utcnow()}}
+        {"$set": {"content": content, "updated_at": utcnow()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Note not found")
@@ -1168,30 +1270,24 @@ async def delete_note(note_id: str, user_id: str):
 # Budget endpoints
 @api_router.get("/budget")
 async def get_budget(user_id: str):
-    budget = await db.budgets.find_one({"user_id": user_id})
-    return budget
+    budget = await db.budgets.find_one({"user_id": user_id}, NO_ID)
+    return AppJSONResponse(Budget.from_db(budget) if budget else None)
 
 @api_router.post("/budget")
-async def create_or_update_budget(budget_data: BudgetCreate, user_id: str):
-    # Check if budget exists
-    existing = await db.budgets.find_one({"user_id": user_id})
-    
-    if existing:
-        # Update existing
-        await db.budgets.update_one(
-            {"user_id": user_id},
-            {"$set": budget_data.dict()}
-        )
-        return await db.budgets.find_one({"user_id": user_id})
-    else:
-        # Create new
-        budget = Budget(
-            user_id=user_id,
-            monthly_amount=budget_data.monthly_amount,
-            start_date=budget_data.start_date
-        )
-        await db.budgets.insert_one(budget.dict())
-        return budget
+async def create_or_update_budget(user_id: str, budget_data: BudgetCreate):
+    # Update the budget, creating it on first save, and get the result back in one round trip
+    budget = Budget(user_id=user_id, **budget_data.model_dump())
+    updated = await db.budgets.find_one_and_update(
+        {"user_id": user_id},
+        {
+            "$set": budget_data.model_dump(),
+            "$setOnInsert": {"id": budget.id, "created_at": budget.created_at}
+        },
+        projection=NO_ID,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return AppJSONResponse(Budget.from_db(updated))
 
 # CSV Import endpoint
 @api_router.post("/import/csv")
@@ -1200,32 +1296,31 @@ async def import_csv(user_id: str, positions: List[dict]):
     imported_count = 0
     errors = []
     
-    # Get or create default portfolio
-    default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
-    if not default_portfolio:
-        first_portfolio = await db.portfolios.find_one({"user_id": user_id})
-        if first_portfolio:
-            portfolio_id = first_portfolio['id']
-        else:
-            new_portfolio = Portfolio(
-                user_id=user_id,
-                name="Portefeuille Principal",
-                description="Mon portefeuille par défaut",
-                is_default=True
-            )
-            await db.portfolios.insert_one(new_portfolio.dict())
-            portfolio_id = new_portfolio.id
-    else:
-        portfolio_id = default_portfolio['id']
+    # Look up ticker info (validate symbols) once per distinct symbol, concurrently but bounded
+    # so a large file does not fire hundreds of Yahoo requests (and worker threads) at once
+    lookup_slots = asyncio.Semaphore(IMPORT_LOOKUP_CONCURRENCY)
     
+    async def lookup(symbol: str) -> Optional[dict]:
+        async with lookup_slots:
+            return await asyncio.to_thread(yf_service.get_ticker_info, symbol)
+    
+    symbols = list({p['symbol'].upper() for p in positions if isinstance(p.get('symbol'), str) and p['symbol']})
+    # Get or create the default portfolio alongside the lookups
+    portfolio_id, *infos = await asyncio.gather(
+        ensure_default_portfolio_id(user_id),
+        *(lookup(symbol) for symbol in symbols)
+    )
+    ticker_infos = dict(zip(symbols, infos))
+    
+    # Validate rows, then insert them all in a single bulk write
+    new_positions = []
     for pos_data in positions:
         try:
             symbol = pos_data.get('symbol', '').upper()
             if not symbol:
                 continue
             
-            # Try to get ticker info (validate symbol)
-            ticker_info = yf_service.get_ticker_info(symbol)
+            ticker_info = ticker_infos.get(symbol)
             name = ticker_info['name'] if ticker_info else symbol
             
             # Create position
@@ -1237,15 +1332,26 @@ async def import_csv(user_id: str, positions: List[dict]):
                 type=pos_data.get('type', 'stock'),
                 quantity=float(pos_data.get('quantity', 0)),
                 avg_price=float(pos_data.get('avg_price', 0)),
-                purchase_date=datetime.fromisoformat(pos_data.get('purchase_date', datetime.utcnow().isoformat()))
+                purchase_date=datetime.fromisoformat(pos_data.get('purchase_date', utcnow().isoformat()))
             )
-            
-            await db.positions.insert_one(position.dict())
-            imported_count += 1
+            new_positions.append(position)
             
         except Exception as e:
             errors.append(f"Erreur pour {pos_data.get('symbol', 'inconnu')}: {str(e)}")
     
+    if new_positions:
+        try:
+            result = await db.positions.bulk_write(
+                [InsertOne(doc) for doc in POSITION_LIST_ADAPTER.dump_python(new_positions)],
+                ordered=False
+            )
+            imported_count = result.inserted_count
+        except BulkWriteError as e:
+            imported_count = e.details.get('nInserted', 0)
+            for write_error in e.details.get('writeErrors', []):
+                symbol = new_positions[write_error['index']].symbol
+                errors.append(f"Erreur pour {symbol}: {write_error.get('errmsg')}")
+    
     return {
         "imported": imported_count,
         "errors": errors,
@@ -1256,31 +1362,17 @@ async def import_csv(user_id: str, positions: List[dict]):
 @api_router.get("/portfolios")
 async def get_portfolios(user_id: str):
     """Get all portfolios for a user"""
-    portfolios = await db.portfolios.find({"user_id": user_id}).to_list(100)
+    portfolios = await db.portfolios.find({"user_id": user_id}, NO_ID).to_list(None)
     
-    # If no portfolios exist, create a default one
+    # If no portfolios exist, create the default one (through the upsert, so concurrent first calls share it)
     if not portfolios:
-        default_portfolio = Portfolio(
-            user_id=user_id,
-            name="Portefeuille Principal",
-            description="Mon portefeuille par défaut",
-            is_default=True
-        )
-        await db.portfolios.insert_one(default_portfolio.dict())
-        portfolios = [default_portfolio.dict()]
-    
-    # Clean MongoDB _id
-    clean_portfolios = []
-    for p in portfolios:
-        clean_p = {k: v for k, v in p.items() if k != '_id'}
-        if 'created_at' in clean_p and hasattr(clean_p['created_at'], 'isoformat'):
-            clean_p['created_at'] = clean_p['created_at'].isoformat()
-        clean_portfolios.append(clean_p)
+        await ensure_default_portfolio_id(user_id)
+        portfolios = await db.portfolios.find({"user_id": user_id}, NO_ID).to_list(None)
     
-    return clean_portfolios
+    return AppJSONResponse(portfolios)
 
 @api_router.post("/portfolios")
-async def create_portfolio(portfolio_data: PortfolioCreate, user_id: str):
+async def create_portfolio(user_id: str, portfolio_data: PortfolioCreate):
     """Create a new portfolio"""
     portfolio = Portfolio(
         user_id=user_id,
@@ -1289,19 +1381,15 @@ async def create_portfolio(portfolio_data: PortfolioCreate, user_id: str):
         is_default=False
     )
     
-    await db.portfolios.insert_one(portfolio.dict())
+    # One dump serves both the insert and the response (insert_one adds _id to it, so drop that first)
+    portfolio_doc = portfolio.model_dump()
+    await db.portfolios.insert_one(portfolio_doc)
+    portfolio_doc.pop("_id", None)
     
-    return {
-        "id": portfolio.id,
-        "user_id": portfolio.user_id,
-        "name": portfolio.name,
-        "description": portfolio.description,
-        "created_at": portfolio.created_at.isoformat(),
-        "is_default": portfolio.is_default
-    }
+    return AppJSONResponse(portfolio_doc)
 
 @api_router.put("/portfolios/{portfolio_id}")
-async def update_portfolio(portfolio_id: str, portfolio_data: PortfolioCreate, user_id: str):
+async def update_portfolio(portfolio_id: str, user_id: str, portfolio_data: PortfolioCreate):
     """Update an existing portfolio"""
     result = await db.portfolios.update_one(
         {"id": portfolio_id, "user_id": user_id},
@@ -1314,26 +1402,27 @@ async def update_portfolio(portfolio_id: str, portfolio_data: PortfolioCreate, u
 @api_router.delete("/portfolios/{portfolio_id}")
 async def delete_portfolio(portfolio_id: str, user_id: str):
     """Delete a portfolio and all its positions"""
-    # Check if it's the only portfolio
-    portfolios = await db.portfolios.find({"user_id": user_id}).to_list(100)
-    if len(portfolios) <= 1:
+    # "Last portfolio?" and "default portfolio?" checks in one round trip
+    portfolio_count, portfolio = await asyncio.gather(
+        db.portfolios.count_documents({"user_id": user_id}, limit=2),
+        db.portfolios.find_one({"id": portfolio_id, "user_id": user_id}, {"_id": 0, "is_default": 1})
+    )
+    if not portfolio:
+        # Unknown portfolio: nothing must be deleted (its id could still tag stray positions)
+        raise HTTPException(status_code=404, detail="Portefeuille non trouvé")
+    if portfolio_count <= 1:
         raise HTTPException(status_code=400, detail="Impossible de supprimer le dernier portefeuille")
-    
-    # Check if this is the default portfolio
-    portfolio = await db.portfolios.find_one({"id": portfolio_id, "user_id": user_id})
-    if portfolio and portfolio.get("is_default"):
+    if portfolio.get("is_default"):
         raise HTTPException(status_code=400, detail="Impossible de supprimer le portefeuille par défaut")
     
-    # Delete all positions in this portfolio
-    await db.positions.delete_many({"portfolio_id": portfolio_id, "user_id": user_id})
-    
-    # Delete all transactions in this portfolio
-    await db.transactions.delete_many({"portfolio_id": portfolio_id, "user_id": user_id})
-    
-    # Delete the portfolio
-    result = await db.portfolios.delete_one({"id": portfolio_id, "user_id": user_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Portefeuille non trouvé")
+    # Delete its positions, its transactions and the portfolio itself concurrently
+    # (the deployment is a standalone mongod, so there is no multi-document transaction to wrap them in)
+    owned = {"portfolio_id": portfolio_id, "user_id": user_id}
+    await asyncio.gather(
+        db.positions.delete_many(owned),
+        db.transactions.delete_many(owned),
+        db.portfolios.delete_one({"id": portfolio_id, "user_id": user_id})
+    )
     
     return {"message": "Portefeuille supprimé avec succès"}
 
@@ -1341,46 +1430,40 @@ async def delete_portfolio(portfolio_id: str, user_id: str):
 @api_router.get("/settings")
 async def get_user_settings(user_id: str):
     """Get user settings including risk-free rate and benchmark"""
-    settings = await db.user_settings.find_one({"user_id": user_id})
+    settings = await db.user_settings.find_one({"user_id": user_id}, SETTINGS_FIELDS)
     if not settings:
         # Create default settings
         default_settings = UserSettings(user_id=user_id)
-        await db.user_settings.insert_one(default_settings.dict())
+        await db.user_settings.insert_one(default_settings.model_dump())
         return {
             "risk_free_rate": default_settings.risk_free_rate,
             "benchmark_index": default_settings.benchmark_index,
-            "updated_at": default_settings.updated_at.isoformat()
+            "updated_at": default_settings.updated_at
         }
     
     return {
         "risk_free_rate": settings.get('risk_free_rate', 3.0),
         "benchmark_index": settings.get('benchmark_index', '^GSPC'),
-        "updated_at": settings['updated_at'].isoformat() if hasattr(settings['updated_at'], 'isoformat') else settings['updated_at']
+        "updated_at": settings['updated_at']
     }
 
 @api_router.put("/settings")
-async def update_user_settings(settings_data: UserSettingsUpdate, user_id: str):
-    """Update user settings"""
-    existing = await db.user_settings.find_one({"user_id": user_id})
-    
-    update_data = {"updated_at": datetime.utcnow()}
-    if settings_data.risk_free_rate is not None:
-        update_data["risk_free_rate"] = settings_data.risk_free_rate
-    if settings_data.benchmark_index is not None:
-        update_data["benchmark_index"] = settings_data.benchmark_index
+async def update_user_settings(user_id: str, settings_data: UserSettingsUpdate):
+    """
+    Partially update user settings: only fields present (and non-null) in the request body are
+    applied, taken from the model's fields-set via model_dump(exclude_unset=True)
+    """
+    existing = await db.user_settings.find_one({"user_id": user_id}, {"_id": 1})
+    changes = settings_data.model_dump(exclude_unset=True, exclude_none=True)
     
     if existing:
         await db.user_settings.update_one(
             {"user_id": user_id},
-            {"$set": update_data}
+            {"$set": {**changes, "updated_at": utcnow()}}
         )
     else:
-        new_settings = UserSettings(
-            user_id=user_id,
-            risk_free_rate=settings_data.risk_free_rate or 3.0,
-            benchmark_index=settings_data.benchmark_index or "^GSPC"
-        )
-        await db.user_settings.insert_one(new_settings.dict())
+        new_settings = UserSettings(user_id=user_id, **changes)
+        await db.user_settings.insert_one(new_settings.model_dump())
     
     return {
         "message": "Paramètres mis à jour", 
@@ -1398,11 +1481,11 @@ async def get_capital_summary(user_id: str, portfolio_id: Optional[str] = None):
         query["portfolio_id"] = portfolio_id
     else:
         # Get default portfolio if not specified
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
+        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True}, ID_FIELD)
         if default_portfolio:
             query["portfolio_id"] = default_portfolio['id']
     
-    contributions = await db.capital_contributions.find(query).sort("date", -1).to_list(1000)
+    contributions = await db.capital_contributions.find(query, NO_ID).sort("date", -1).to_list(None)
     
     total_deposits = sum(c['amount'] for c in contributions if c['type'] == 'deposit')
     total_withdrawals = sum(c['amount'] for c in contributions if c['type'] == 'withdrawal')
@@ -1414,7 +1497,7 @@ async def get_capital_summary(user_id: str, portfolio_id: Optional[str] = None):
         "type": c.get("type"),
         "amount": c.get("amount"),
         "description": c.get("description", ""),
-        "date": c.get("date").isoformat() if hasattr(c.get("date"), 'isoformat') else c.get("date"),
+        "date": c.get("date"),
         "portfolio_id": c.get("portfolio_id")
     } for c in contributions]
     
@@ -1437,29 +1520,23 @@ async def add_capital_contribution(user_id: str, type: str, amount: float, portf
     
     # Get portfolio_id if not provided
     if not portfolio_id:
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
-        if default_portfolio:
-            portfolio_id = default_portfolio['id']
-        else:
-            first_portfolio = await db.portfolios.find_one({"user_id": user_id})
-            if first_portfolio:
-                portfolio_id = first_portfolio['id']
+        portfolio_id = await default_portfolio_id(user_id)
     
     contribution = {
-        "id": str(uuid.uuid4()),
+        "id": new_id(),
         "user_id": user_id,
         "portfolio_id": portfolio_id,
         "type": type,
         "amount": amount,
         "description": description,
-        "date": datetime.utcnow(),
-        "created_at": datetime.utcnow()
+        "date": utcnow(),
+        "created_at": utcnow()
     }
     
     await db.capital_contributions.insert_one(contribution)
     
     # Recalculate totals for this portfolio
-    contributions = await db.capital_contributions.find({"user_id": user_id, "portfolio_id": portfolio_id}).to_list(1000)
+    contributions = await db.capital_contributions.find({"user_id": user_id, "portfolio_id": portfolio_id}, CONTRIBUTION_FIELDS).to_list(None)
     total_deposits = sum(c['amount'] for c in contributions if c['type'] == 'deposit')
     total_withdrawals = sum(c['amount'] for c in contributions if c['type'] == 'withdrawal')
     net_capital = total_deposits - total_withdrawals
@@ -1489,61 +1566,49 @@ async def get_cash_accounts(user_id: str, portfolio_id: Optional[str] = None):
         query["portfolio_id"] = portfolio_id
     else:
         # Get default portfolio if not specified
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
+        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True}, ID_FIELD)
         if default_portfolio:
             query["portfolio_id"] = default_portfolio['id']
     
-    accounts = await db.cash_accounts.find(query).to_list(100)
+    accounts = await db.cash_accounts.find(query, CASH_ACCOUNT_FIELDS).to_list(None)
     
     # If no accounts for this portfolio, create default EUR account
     if not accounts and query.get("portfolio_id"):
         default_account = {
-            "id": str(uuid.uuid4()),
+            "id": new_id(),
             "user_id": user_id,
             "portfolio_id": query["portfolio_id"],
             "currency": "EUR",
             "balance": 0.0,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": utcnow(),
+            "updated_at": utcnow()
         }
         await db.cash_accounts.insert_one(default_account)
-        accounts = [default_account]
+        accounts = [{field: default_account[field] for field in CASH_ACCOUNT_FIELDS if field != "_id"}]
     
-    # Clean MongoDB _id
-    return [{
-        "id": acc.get("id"),
-        "portfolio_id": acc.get("portfolio_id"),
-        "currency": acc.get("currency"),
-        "balance": acc.get("balance", 0.0),
-        "updated_at": acc.get("updated_at").isoformat() if hasattr(acc.get("updated_at"), 'isoformat') else acc.get("updated_at")
-    } for acc in accounts]
+    # The projection already shaped the documents: no per-account rebuild
+    return AppJSONResponse(accounts)
 
 @api_router.post("/cash-accounts")
 async def create_cash_account(user_id: str, currency: str = "EUR", portfolio_id: Optional[str] = None):
     """Create a new cash account for a specific currency and portfolio"""
     # Get portfolio_id if not provided
     if not portfolio_id:
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
-        if default_portfolio:
-            portfolio_id = default_portfolio['id']
-        else:
-            first_portfolio = await db.portfolios.find_one({"user_id": user_id})
-            if first_portfolio:
-                portfolio_id = first_portfolio['id']
+        portfolio_id = await default_portfolio_id(user_id)
     
     # Check if account already exists for this currency and portfolio
-    existing = await db.cash_accounts.find_one({"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency})
+    existing = await db.cash_accounts.find_one({"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency}, ID_FIELD)
     if existing:
         return {"message": "Compte déjà existant", "id": existing.get("id"), "currency": currency, "portfolio_id": portfolio_id}
     
     new_account = {
-        "id": str(uuid.uuid4()),
+        "id": new_id(),
         "user_id": user_id,
         "portfolio_id": portfolio_id,
         "currency": currency,
         "balance": 0.0,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "created_at": utcnow(),
+        "updated_at": utcnow()
     }
     await db.cash_accounts.insert_one(new_account)
     return {"message": "Compte créé", "id": new_account["id"], "currency": currency, "portfolio_id": portfolio_id}
@@ -1553,40 +1618,22 @@ async def update_cash_account(currency: str, user_id: str, amount: float, operat
     """Update cash account balance. Operation: 'set', 'add', 'subtract'"""
     # Get portfolio_id if not provided
     if not portfolio_id:
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
+        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True}, ID_FIELD)
         if default_portfolio:
             portfolio_id = default_portfolio['id']
     
-    account = await db.cash_accounts.find_one({"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency})
-    
-    if not account:
-        # Create account if doesn't exist
-        account = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "portfolio_id": portfolio_id,
-            "currency": currency,
-            "balance": 0.0,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        await db.cash_accounts.insert_one(account)
-    
-    current_balance = account.get("balance", 0.0)
-    
-    if operation == "set":
-        new_balance = amount
-    elif operation == "add":
-        new_balance = current_balance + amount
-    elif operation == "subtract":
-        new_balance = current_balance - amount
+    # add/subtract apply atomically to the stored balance; set (and unknown operations) overwrite it,
+    # creating the account if it doesn't exist either way
+    if operation in ("add", "subtract"):
+        new_balance = await move_cash(user_id, portfolio_id, currency, amount if operation == "add" else -amount)
     else:
         new_balance = amount
-    
-    await db.cash_accounts.update_one(
-        {"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
-    )
+        now = utcnow()
+        await db.cash_accounts.update_one(
+            {"user_id": user_id, "portfolio_id": portfolio_id, "currency": currency},
+            {"$set": {"balance": new_balance, "updated_at": now}, "$setOnInsert": {"id": new_id(), "created_at": now}},
+            upsert=True
+        )
     
     return {"message": "Solde mis à jour", "currency": currency, "balance": new_balance, "portfolio_id": portfolio_id}
 
@@ -1595,7 +1642,7 @@ async def delete_cash_account(currency: str, user_id: str, portfolio_id: Optiona
     """Delete a cash account"""
     # Get portfolio_id if not provided
     if not portfolio_id:
-        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True})
+        default_portfolio = await db.portfolios.find_one({"user_id": user_id, "is_default": True}, ID_FIELD)
         if default_portfolio:
             portfolio_id = default_portfolio['id']
     
@@ -1605,122 +1652,141 @@ async def delete_cash_account(currency: str, user_id: str, portfolio_id: Optiona
     return {"message": "Compte supprimé"}
 
 # Legacy Cash endpoints (keeping for backward compatibility)
+
+# Per-user cash balance reads, dropped by every balance write below
+CASH_BALANCE_CACHE_DURATION = 5  # seconds
+_cash_balance_cache = {}
+
+def _forget_cash_balance(user_id: str) -> None:
+    cache_invalidate(_cash_balance_cache, user_id)
+
 @api_router.get("/cash/balance")
 async def get_cash_balance(user_id: str):
-    """Get current cash balance"""
-    balance = await db.cash_balances.find_one({"user_id": user_id})
-    if not balance:
-        # Create initial balance
-        new_balance = CashBalance(user_id=user_id, balance=0.0)
-        await db.cash_balances.insert_one(new_balance.dict())
-        return {"balance": 0.0, "updated_at": new_balance.updated_at.isoformat()}
-    
-    return {
-        "balance": balance['balance'],
-        "updated_at": balance['updated_at'].isoformat() if hasattr(balance['updated_at'], 'isoformat') else balance['updated_at']
-    }
+    """Get current cash balance (cached briefly: the dashboard polls it)"""
+    cached = cache_get(_cash_balance_cache, user_id, CASH_BALANCE_CACHE_DURATION)
+    if cached is not None:
+        return dict(cached)
+    
+    # Read the balance, creating the initial one atomically on first use (user_id is unique)
+    read_at = time.monotonic()
+    initial = CashBalance(user_id=user_id, balance=0.0).model_dump()
+    del initial['user_id']
+    balance = await db.cash_balances.find_one_and_update(
+        {"user_id": user_id},
+        {"$setOnInsert": initial},
+        projection={"_id": 0, "balance": 1, "updated_at": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    result = {"balance": balance['balance'], "updated_at": balance['updated_at']}
+    # Skipped if a balance write invalidated the entry while this read was in flight
+    cache_set(_cash_balance_cache, user_id, result, read_at=read_at)
+    return dict(result)
 
 @api_router.get("/cash/transactions")
-async def get_cash_transactions(user_id: str):
-    """Get cash transaction history"""
-    transactions = await db.cash_transactions.find({"user_id": user_id}).sort("date", -1).to_list(1000)
-    
-    clean_transactions = []
-    for t in transactions:
-        clean_t = {k: v for k, v in t.items() if k != '_id'}
-        if 'date' in clean_t and hasattr(clean_t['date'], 'isoformat'):
-            clean_t['date'] = clean_t['date'].isoformat()
-        if 'created_at' in clean_t and hasattr(clean_t['created_at'], 'isoformat'):
-            clean_t['created_at'] = clean_t['created_at'].isoformat()
-        clean_transactions.append(clean_t)
-    
-    return clean_transactions
+async def get_cash_transactions(user_id: str, skip: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    """Get cash transaction history, newest first (optionally one skip/limit page of it)"""
+    cursor = paged(db.cash_transactions.find({"user_id": user_id}, NO_ID).sort("date", -1), skip, limit)
+    # Stream as the driver fetches; documents go out as stored (automatic entries carry currency/portfolio_id)
+    return json_stream(cursor)
 
 @api_router.post("/cash/transaction")
-async def add_cash_transaction(transaction_data: CashTransactionCreate, user_id: str):
-    """Add a cash deposit or withdrawal"""
-    # Validate type
-    if transaction_data.type not in ['deposit', 'withdrawal']:
-        raise HTTPException(status_code=400, detail="Type doit être 'deposit' ou 'withdrawal'")
-    
-    # Get current balance
-    balance_doc = await db.cash_balances.find_one({"user_id": user_id})
-    current_balance = balance_doc['balance'] if balance_doc else 0.0
-    
-    # Calculate new balance
-    if transaction_data.type == 'deposit':
-        new_balance = current_balance + transaction_data.amount
-    else:
-        new_balance = current_balance - transaction_data.amount
-        if new_balance < 0:
-            raise HTTPException(status_code=400, detail="Solde insuffisant pour ce retrait")
-    
-    # Create transaction
+async def add_cash_transaction(user_id: str, transaction_data: CashTransactionCreate):
+    """Add a cash deposit or withdrawal (type is validated by CashTransactionCreate)"""
+    amount = transaction_data.amount
+    now = utcnow()
     transaction = CashTransaction(
         user_id=user_id,
         type=transaction_data.type,
-        amount=transaction_data.amount,
+        amount=amount,
         description=transaction_data.description,
-        date=transaction_data.date or datetime.utcnow()
+        date=transaction_data.date or now
     )
-    await db.cash_transactions.insert_one(transaction.dict())
     
-    # Update balance
-    if balance_doc:
-        await db.cash_balances.update_one(
-            {"user_id": user_id},
-            {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
+    # Apply the movement to the balance in one atomic update, getting the new balance back
+    if transaction_data.type == 'deposit':
+        # Deposits always succeed (creating the balance document on first use):
+        # record the transaction alongside the balance update
+        balance_doc, _ = await asyncio.gather(
+            db.cash_balances.find_one_and_update(
+                {"user_id": user_id},
+                {"$inc": {"balance": amount}, "$set": {"updated_at": now}, "$setOnInsert": {"id": new_id()}},
+                projection={"_id": 0, "balance": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            ),
+            db.cash_transactions.insert_one(transaction.model_dump())
         )
     else:
-        new_balance_doc = CashBalance(user_id=user_id, balance=new_balance)
-        await db.cash_balances.insert_one(new_balance_doc.dict())
+        # Withdrawals only match while the balance covers them, so concurrent ones cannot overdraw it;
+        # the transaction is recorded once the withdrawal went through
+        balance_doc = await db.cash_balances.find_one_and_update(
+            {"user_id": user_id, "balance": {"$gte": amount}},
+            {"$inc": {"balance": -amount}, "$set": {"updated_at": now}},
+            projection={"_id": 0, "balance": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if balance_doc is None:
+            raise HTTPException(status_code=400, detail="Solde insuffisant pour ce retrait")
+        await db.cash_transactions.insert_one(transaction.model_dump())
+    _forget_cash_balance(user_id)
+    new_balance = balance_doc['balance']
     
-    return {
+    return AppJSONResponse({
         "message": "Transaction enregistrée",
         "new_balance": new_balance,
         "transaction_id": transaction.id
-    }
+    })
 
 @api_router.delete("/cash/transaction/{transaction_id}")
 async def delete_cash_transaction(transaction_id: str, user_id: str):
     """Delete a cash transaction and adjust balance"""
-    # Find the transaction
-    transaction = await db.cash_transactions.find_one({"id": transaction_id, "user_id": user_id})
+    # Delete the transaction and get it back in one step: a concurrent delete cannot reverse it twice
+    transaction = await db.cash_transactions.find_one_and_delete(
+        {"id": transaction_id, "user_id": user_id},
+        projection={"_id": 0, "type": 1, "amount": 1}
+    )
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction non trouvée")
     
-    # Get current balance
-    balance_doc = await db.cash_balances.find_one({"user_id": user_id})
-    current_balance = balance_doc['balance'] if balance_doc else 0.0
-    
-    # Reverse the transaction
-    if transaction['type'] == 'deposit':
-        new_balance = current_balance - transaction['amount']
-    else:
-        new_balance = current_balance + transaction['amount']
-    
-    # Delete transaction
-    await db.cash_transactions.delete_one({"id": transaction_id, "user_id": user_id})
-    
-    # Update balance
-    await db.cash_balances.update_one(
+    # Reverse the transaction atomically on the stored balance
+    reversal = -transaction['amount'] if transaction['type'] == 'deposit' else transaction['amount']
+    balance_doc = await db.cash_balances.find_one_and_update(
         {"user_id": user_id},
-        {"$set": {"balance": new_balance, "updated_at": datetime.utcnow()}}
+        {"$inc": {"balance": reversal}, "$set": {"updated_at": utcnow()}},
+        projection={"_id": 0, "balance": 1},
+        return_document=ReturnDocument.AFTER
     )
+    _forget_cash_balance(user_id)
+    new_balance = balance_doc['balance'] if balance_doc else reversal
     
     return {"message": "Transaction supprimée", "new_balance": new_balance}
 
 # Include the router in the main app
-app.include_router(api_router)
-
+# Compress larger JSON payloads (positions, histories, performance series) for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+def cors_allow_credentials(origins: List[str]) -> bool:
+    """CORS_ALLOW_CREDENTIALS if set, else credentials only with an explicit origin list
+    (browsers reject credentialed responses carrying "Access-Control-Allow-Origin: *")"""
+    setting = os.environ.get('CORS_ALLOW_CREDENTIALS', '').strip().lower()
+    if setting:
+        return setting in ('1', 'true', 'yes')
+    return "*" not in origins
+
+# CORS: let browsers cache preflight answers instead of sending an OPTIONS before every call
+cors_origins = [origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(',') if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
+    allow_credentials=cors_allow_credentials(cors_origins),
+    allow_origins=cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=7200,
 )
 
+app.include_router(api_router)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1728,26 +1794,103 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# MongoDB indexes matching the endpoint query predicates: equality fields first, then sort keys
+INDEXES = {
+    "users": [([("email", 1)], {"unique": True}), ([("id", 1)], {})],
+    "positions": [([("user_id", 1), ("portfolio_id", 1), ("symbol", 1)], {}), ([("user_id", 1), ("symbol", 1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "transactions": [([("user_id", 1), ("date", -1)], {}), ([("user_id", 1), ("portfolio_id", 1)], {})],
+    "dividends": [([("user_id", 1), ("date", -1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "alerts": [([("user_id", 1), ("created_at", -1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "goals": [([("user_id", 1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "notes": [([("position_id", 1), ("user_id", 1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "position_notes": [([("position_id", 1), ("user_id", 1)], {})],
+    "portfolios": [
+        ([("user_id", 1), ("is_default", 1)], {}),
+        ([("id", 1), ("user_id", 1)], {}),
+        # At most one default portfolio per user, so the get-or-create upsert cannot race into two
+        ([("user_id", 1)], {"unique": True, "partialFilterExpression": {"is_default": True}, "name": "one_default_portfolio"}),
+    ],
+    "budgets": [([("user_id", 1)], {})],
+    "user_settings": [([("user_id", 1)], {})],
+    "cash_balances": [([("user_id", 1)], {"unique": True})],  # one balance per user: keeps the deposit upsert race-free
+    "cash_transactions": [([("user_id", 1), ("date", -1)], {}), ([("id", 1), ("user_id", 1)], {})],
+    "cash_accounts": [([("user_id", 1), ("portfolio_id", 1), ("currency", 1)], {})],
+    "capital_contributions": [([("user_id", 1), ("portfolio_id", 1), ("date", -1)], {}), ([("id", 1), ("user_id", 1)], {})],
+}
+
+async def normalize_user_emails():
+    """Lowercase the emails of accounts created before they were normalized on input"""
+    try:
+        async for user in db.users.find({"email": {"$regex": "[A-Z]|^\\s|\\s$"}}, {"_id": 0, "id": 1, "email": 1}):
+            try:
+                await db.users.update_one({"id": user['id']}, {"$set": {"email": user['email'].strip().lower()}})
+            except DuplicateKeyError:
+                logger.error(f"Cannot normalize email of user {user['id']}: another account already uses it")
+    except Exception as e:
+        logger.error(f"Error normalizing user emails: {str(e)}")
+
+@app.on_event("startup")
+async def create_indexes():
+    # Normalize legacy emails first so the unique email index matches how they are looked up
+    await normalize_user_emails()
+    # create_index is a no-op when the index already exists; a failure (e.g. duplicate
+    # emails blocking the unique index) is logged instead of preventing startup
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except Exception as e:
+                logger.error(f"Error creating index {keys} on {collection}: {str(e)}")
+
+@app.on_event("startup")
+async def load_password_backend():
+    # passlib picks and imports its bcrypt backend lazily: do it now rather than on the first register/login
+    await asyncio.to_thread(pwd_context.handler().get_backend)
+
+# Background refresh of market data for every held symbol, so requests find warm caches: each pass refetches
+# the prices and metrics that would expire before the next pass, keeping the request-path TTLs satisfied.
+# The caches are per process, so every uvicorn worker runs its own refresher (the Dockerfile starts one).
+DEFAULT_MARKET_REFRESH_INTERVAL = PRICE_CACHE_DURATION // 2
+
+def market_refresh_interval() -> int:
+    """MARKET_REFRESH_INTERVAL in seconds (0 disables); it must stay below the price TTL to keep prices warm"""
+    interval = int(os.environ.get('MARKET_REFRESH_INTERVAL', DEFAULT_MARKET_REFRESH_INTERVAL))
+    if interval != 0 and not 0 < interval < PRICE_CACHE_DURATION:
+        logger.warning(
+            f"MARKET_REFRESH_INTERVAL={interval} must be between 1 and {PRICE_CACHE_DURATION - 1} seconds "
+            f"(or 0 to disable): using {DEFAULT_MARKET_REFRESH_INTERVAL}"
+        )
+        return DEFAULT_MARKET_REFRESH_INTERVAL
+    return interval
 
+MARKET_REFRESH_INTERVAL = market_refresh_interval()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def refresh_market_data():
+    while True:
+        try:
+            symbols, benchmarks = await asyncio.gather(
+                db.positions.distinct("symbol", {"quantity": {"$gt": 0}}),
+                db.user_settings.distinct("benchmark_index")
+            )
+            if symbols:
+                await asyncio.to_thread(
+                    yf_service.get_current_prices, symbols, max_age=PRICE_CACHE_DURATION - MARKET_REFRESH_INTERVAL
+                )
+                for benchmark in {'^GSPC', *filter(None, benchmarks)}:
+                    await asyncio.to_thread(
+                        analytics_service.calculate_batch_metrics, symbols, market_index=benchmark,
+                        max_age=METRICS_CACHE_DURATION - MARKET_REFRESH_INTERVAL
+                    )
+        except Exception as e:
+            logger.error(f"Error refreshing market data: {str(e)}")
+        await asyncio.sleep(MARKET_REFRESH_INTERVAL)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+@app.on_event("startup")
+async def start_market_refresh():
+    app.state.market_refresh = asyncio.create_task(refresh_market_data()) if MARKET_REFRESH_INTERVAL > 0 else None
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if app.state.market_refresh is not None:
+        app.state.market_refresh.cancel()
+    client.close()
@@ -0,0 +1,90 @@
+"""Test fixtures: the API runs against an in-memory MongoDB (mongomock-motor) and a stubbed yfinance"""
+import os
+import sys
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "portfoliohub_test")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["MARKET_REFRESH_INTERVAL"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock.aggregate
+import numpy as np
+import pandas as pd
+import pytest
+import yfinance as yf
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+PRICES = {"AAPL": 200.0, "MSFT": 400.0, "BTC-USD": 60000.0, "^GSPC": 5000.0, "USDEUR=X": 0.9}
+
+# mongomock lacks $round (MongoDB 4.2+), used by the position upsert pipeline
+_handle_arithmetic_operator = mongomock.aggregate._Parser._handle_arithmetic_operator
+
+def _handle_round(self, operator, values):
+    if operator == '$round':
+        number, places = self.parse_many(values)
+        return None if number is None else round(number, places)
+    return _handle_arithmetic_operator(self, operator, values)
+
+mongomock.aggregate.binary_arithmetic_operators.add('$round')
+mongomock.aggregate.arithmetic_operators.add('$round')
+mongomock.aggregate._Parser._handle_arithmetic_operator = _handle_round
+
+def fake_history(symbol: str) -> pd.DataFrame:
+    """Deterministic daily history ending at the symbol's current price"""
+    index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=260, freq="D", tz="America/New_York")
+    rng = np.random.default_rng(sum(map(ord, symbol)))
+    close = PRICES[symbol] * np.cumprod(1 + rng.normal(0, 0.01, len(index)))
+    close[-1] = PRICES[symbol]
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1}, index=index)
+
+class FakeTicker:
+    def __init__(self, symbol, session=None):
+        self.ticker = symbol.upper()
+
+    def history(self, period="1y", start=None, end=None, **kwargs):
+        if self.ticker not in PRICES:
+            return pd.DataFrame()
+        history = fake_history(self.ticker)
+        if period in ("1d", "2d"):
+            return history.tail(int(period[0]))
+        if start:
+            history = history[history.index.tz_localize(None) >= pd.Timestamp(start)]
+        return history
+
+    @property
+    def info(self):
+        if self.ticker not in PRICES:
+            raise ValueError(f"unknown symbol {self.ticker}")
+        return {"longName": f"{self.ticker} Inc", "currentPrice": PRICES[self.ticker], "quoteType": "EQUITY", "sector": "Technology"}
+
+def fake_download(tickers, period="1y", start=None, end=None, group_by=None, **kwargs):
+    if isinstance(tickers, str):
+        tickers = tickers.split()
+    frames = {}
+    for symbol in tickers:
+        history = FakeTicker(symbol).history(period=period, start=start, end=end)
+        if not history.empty:
+            frames[symbol.upper()] = history
+    if not frames:
+        return pd.DataFrame()
+    data = pd.concat(frames, axis=1)
+    return data if group_by == "ticker" else data.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+yf.Ticker = FakeTicker
+yf.download = fake_download
+
+import server  # noqa: E402  (needs the environment and stubs above)
+
+@pytest.fixture
+def client():
+    server.client = AsyncMongoMockClient()
+    server.db = server.client[os.environ["DB_NAME"]]
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def user_id(client):
+    response = client.post("/api/auth/register", json={"name": "Test", "email": "test@example.com", "password": "secret"})
+    return response.json()["id"]
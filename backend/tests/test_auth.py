@@ -0,0 +1,44 @@
+import server
+
+def test_email_is_normalized(client):
+    response = client.post("/api/auth/register", json={"name": "Ann", "email": " Ann@Example.COM ", "password": "pw"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "ann@example.com"
+
+    response = client.post("/api/auth/login", json={"email": "ANN@example.com", "password": "pw"})
+    assert response.status_code == 200
+
+def test_duplicate_email_is_rejected(client):
+    client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+    response = client.post("/api/auth/register", json={"name": "Ann", "email": "ANN@example.com", "password": "pw"})
+    assert response.status_code == 400
+
+def test_wrong_password_is_rejected(client):
+    client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+    response = client.post("/api/auth/login", json={"email": "ann@example.com", "password": "nope"})
+    assert response.status_code == 401
+
+def test_legacy_mixed_case_email_is_normalized_at_startup(client):
+    client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+    client.portal.call(server.db.users.update_one, {"email": "ann@example.com"}, {"$set": {"email": "Ann@Example.com"}})
+    response = client.post("/api/auth/login", json={"email": "ann@example.com", "password": "pw"})
+    assert response.status_code == 401
+
+    client.portal.call(server.normalize_user_emails)
+    response = client.post("/api/auth/login", json={"email": "ann@example.com", "password": "pw"})
+    assert response.status_code == 200
+
+def test_concurrent_duplicate_registration_is_rejected(client, monkeypatch):
+    client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+
+    async def not_found(email):
+        return None
+    # As if the other registration landed between the existence check and the insert
+    monkeypatch.setattr(server, "get_user_by_email", not_found)
+    response = client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+def test_invalid_email_is_rejected(client):
+    response = client.post("/api/auth/register", json={"name": "Test", "email": "not-an-email", "password": "secret"})
+    assert response.status_code == 422
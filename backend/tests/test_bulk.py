@@ -0,0 +1,34 @@
+import server
+
+def test_bulk_delete_positions(client, user_id):
+    ids = [
+        client.post("/api/positions", params={"user_id": user_id},
+                    json={"symbol": symbol, "type": "stock", "quantity": 1, "avg_price": 100.0}).json()["id"]
+        for symbol in ("AAPL", "MSFT")
+    ]
+    response = client.post("/api/positions/bulk-delete", params={"user_id": user_id}, json=[ids[0], "unknown"])
+    assert response.json()["deleted"] == 1
+    assert [p["id"] for p in client.get("/api/positions", params={"user_id": user_id}).json()] == [ids[1]]
+
+    # Another user's ids are left alone
+    response = client.post("/api/positions/bulk-delete", params={"user_id": "someone-else"}, json=[ids[1]])
+    assert response.json()["deleted"] == 0
+
+def test_bulk_acknowledge_alerts(client, user_id):
+    ids = [
+        client.post("/api/alerts", params={"user_id": user_id},
+                    json={"symbol": "AAPL", "alert_type": "price_above", "target_value": value}).json()["id"]
+        for value in (100.0, 300.0)
+    ]
+    response = client.post("/api/alerts/bulk-acknowledge", params={"user_id": user_id}, json=[ids[0]])
+    assert response.json()["acknowledged"] == 1
+    alerts = {a["id"]: a for a in client.get("/api/alerts", params={"user_id": user_id}).json()}
+    assert alerts[ids[0]]["is_acknowledged"] and not alerts[ids[1]]["is_acknowledged"]
+
+def test_bulk_bodies_are_capped(client, user_id):
+    ids = [str(i) for i in range(server.BULK_MAX_IDS + 1)]
+    for path in ("/api/positions/bulk-delete", "/api/alerts/bulk-acknowledge"):
+        response = client.post(path, params={"user_id": user_id}, json=ids)
+        assert response.status_code == 422
+        response = client.post(path, params={"user_id": user_id}, json=ids[:-1])
+        assert response.status_code == 200
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import cache
+from utils.cache import cache_get, cache_invalidate, cache_set, fetch_lock
+
+def test_invalidation_beats_an_earlier_read():
+    cache = {}
+    read_at = time.monotonic()
+    cache_invalidate(cache, "user")
+    cache_set(cache, "user", {"balance": 1.0}, read_at=read_at)
+    assert cache_get(cache, "user", 60) is None
+
+    cache_set(cache, "user", {"balance": 2.0}, read_at=time.monotonic())
+    assert cache_get(cache, "user", 60) == {"balance": 2.0}
+
+def test_entries_expire():
+    cache = {}
+    cache_set(cache, "key", 1)
+    assert cache_get(cache, "key", 60) == 1
+    assert cache_get(cache, "key", 0) is None
+
+def test_fetch_locks_are_released_after_use():
+    def fetch(_):
+        with fetch_lock("info:AAPL"):
+            time.sleep(0.01)
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(fetch, range(8)))
+    assert "info:AAPL" not in cache._fetch_locks
+
+def test_returns_are_cached_per_symbol(monkeypatch):
+    from utils import yahoo_finance
+    from utils.yahoo_finance import YahooFinanceService
+
+    YahooFinanceService.invalidate_symbol("AAPL")
+    YahooFinanceService.invalidate_symbol("MSFT")
+    downloads = []
+    closes = YahooFinanceService.get_historical_closes
+    monkeypatch.setattr(YahooFinanceService, "get_historical_closes",
+                        staticmethod(lambda symbols, period: downloads.append(list(symbols)) or closes(symbols, period)))
+
+    first = YahooFinanceService.get_historical_returns(["AAPL", "MSFT"], "1y")
+    assert list(first.columns) == ["AAPL", "MSFT"]
+    second = YahooFinanceService.get_historical_returns(["MSFT", "AAPL"], "1y")
+    assert downloads == [["AAPL", "MSFT"]]
+    assert second["AAPL"].equals(first["AAPL"])
+
+    YahooFinanceService.invalidate_symbol("msft")
+    YahooFinanceService.get_historical_returns(["AAPL", "MSFT"], "1y")
+    assert downloads == [["AAPL", "MSFT"], ["MSFT"]]
+    assert "AAPL:1y" in yahoo_finance._returns_cache
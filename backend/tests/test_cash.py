@@ -0,0 +1,66 @@
+def cash_transaction(client, user_id, type, amount):
+    return client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": type, "amount": amount})
+
+def balance(client, user_id):
+    return client.get("/api/cash/balance", params={"user_id": user_id}).json()["balance"]
+
+def test_balance_starts_at_zero(client, user_id):
+    assert balance(client, user_id) == 0.0
+
+def test_cached_balance_follows_writes(client, user_id):
+    assert balance(client, user_id) == 0.0
+    client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": "deposit", "amount": 50})
+    assert balance(client, user_id) == 50
+
+def test_deposit_then_withdrawal(client, user_id):
+    response = cash_transaction(client, user_id, "deposit", 1000)
+    assert response.status_code == 200
+    assert response.json()["new_balance"] == 1000
+
+    response = cash_transaction(client, user_id, "withdrawal", 250)
+    assert response.status_code == 200
+    assert response.json()["new_balance"] == 750
+    assert balance(client, user_id) == 750
+
+def test_withdrawal_beyond_balance_is_rejected(client, user_id):
+    cash_transaction(client, user_id, "deposit", 100)
+    response = cash_transaction(client, user_id, "withdrawal", 150)
+    assert response.status_code == 400
+    assert balance(client, user_id) == 100
+    # The refused withdrawal is not recorded
+    transactions = client.get("/api/cash/transactions", params={"user_id": user_id}).json()
+    assert [t["type"] for t in transactions] == ["deposit"]
+
+def test_delete_reverses_the_transaction(client, user_id):
+    cash_transaction(client, user_id, "deposit", 500)
+    withdrawal_id = cash_transaction(client, user_id, "withdrawal", 200).json()["transaction_id"]
+
+    response = client.delete(f"/api/cash/transaction/{withdrawal_id}", params={"user_id": user_id})
+    assert response.status_code == 200
+    assert response.json()["new_balance"] == 500
+    assert balance(client, user_id) == 500
+
+    response = client.delete(f"/api/cash/transaction/{withdrawal_id}", params={"user_id": user_id})
+    assert response.status_code == 404
+
+def test_invalid_transaction_type_is_rejected(client, user_id):
+    response = cash_transaction(client, user_id, "transfer", 10)
+    assert response.status_code == 422
+
+def test_linked_trades_move_the_portfolio_cash_account(client, user_id):
+    def trade(transaction_type, quantity):
+        return client.post("/api/positions", params={"user_id": user_id}, json={
+            "symbol": "AAPL", "type": "stock", "transaction_type": transaction_type, "quantity": quantity,
+            "avg_price": 100.0, "link_to_cash": True, "cash_currency": "USD"
+        }).json()
+
+    assert trade("buy", 3)["new_cash_balance"] == -300
+    assert trade("sell", 1)["new_cash_balance"] == -200
+
+    response = client.put("/api/cash-accounts/USD", params={"user_id": user_id, "amount": 50, "operation": "add"})
+    assert response.json()["balance"] == -150
+    response = client.put("/api/cash-accounts/USD", params={"user_id": user_id, "amount": 1000, "operation": "set"})
+    assert response.json()["balance"] == 1000
+
+    accounts = client.get("/api/cash-accounts", params={"user_id": user_id}).json()
+    assert [a["balance"] for a in accounts if a["currency"] == "USD"] == [1000]
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from utils import yahoo_finance
+
+class StopRefresh(Exception):
+    pass
+
+def test_refresh_pass_refetches_prices_about_to_expire(client, user_id, monkeypatch):
+    monkeypatch.setattr(server, "MARKET_REFRESH_INTERVAL", 15)
+    client.post("/api/positions", params={"user_id": user_id},
+                json={"symbol": "AAPL", "type": "stock", "quantity": 1, "avg_price": 100.0})
+    client.get("/api/positions", params={"user_id": user_id})
+    # Age the cached price past the point where it would expire before the next pass
+    fetched_at, price = yahoo_finance._price_cache["AAPL"]
+    yahoo_finance._price_cache["AAPL"] = (fetched_at - 16, price)
+
+    async def stop(seconds):
+        raise StopRefresh
+    # One pass only: the loop ends at its first sleep
+    monkeypatch.setattr(server.asyncio, "sleep", stop)
+    with pytest.raises(StopRefresh):
+        client.portal.call(server.refresh_market_data)
+
+    refreshed_at, _ = yahoo_finance._price_cache["AAPL"]
+    assert time.monotonic() - refreshed_at < 1
+
+@pytest.mark.parametrize("configured, expected", [
+    (None, server.DEFAULT_MARKET_REFRESH_INTERVAL),
+    ("0", 0),
+    ("10", 10),
+    ("30", server.DEFAULT_MARKET_REFRESH_INTERVAL),
+    ("300", server.DEFAULT_MARKET_REFRESH_INTERVAL),
+    ("-5", server.DEFAULT_MARKET_REFRESH_INTERVAL),
+])
+def test_refresh_interval_stays_below_the_price_ttl(monkeypatch, configured, expected):
+    if configured is None:
+        monkeypatch.delenv("MARKET_REFRESH_INTERVAL", raising=False)
+    else:
+        monkeypatch.setenv("MARKET_REFRESH_INTERVAL", configured)
+    assert server.market_refresh_interval() == expected
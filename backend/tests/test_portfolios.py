@@ -0,0 +1,60 @@
+import asyncio
+
+import orjson
+
+import server
+
+def test_first_listing_creates_one_default_portfolio(client, user_id):
+    portfolios = client.get("/api/portfolios", params={"user_id": user_id}).json()
+    assert [(p["name"], p["is_default"]) for p in portfolios] == [("Portefeuille Principal", True)]
+    assert client.get("/api/portfolios", params={"user_id": user_id}).json() == portfolios
+
+def test_concurrent_first_listings_share_the_default_portfolio(client, user_id):
+    async def list_twice():
+        responses = await asyncio.gather(server.get_portfolios(user_id), server.get_portfolios(user_id))
+        return [orjson.loads(response.body) for response in responses]
+
+    first, second = client.portal.call(list_twice)
+    assert len(first) == len(second) == 1
+    assert first[0]["id"] == second[0]["id"]
+
+def test_delete_portfolio(client, user_id):
+    default_id = client.get("/api/portfolios", params={"user_id": user_id}).json()[0]["id"]
+    other_id = client.post("/api/portfolios", params={"user_id": user_id}, json={"name": "PEA"}).json()["id"]
+    client.post("/api/positions", params={"user_id": user_id},
+                json={"symbol": "AAPL", "type": "stock", "quantity": 1, "avg_price": 100.0, "portfolio_id": other_id})
+
+    response = client.delete("/api/portfolios/unknown", params={"user_id": user_id})
+    assert response.status_code == 404
+    response = client.delete(f"/api/portfolios/{default_id}", params={"user_id": user_id})
+    assert response.status_code == 400
+
+    response = client.delete(f"/api/portfolios/{other_id}", params={"user_id": user_id})
+    assert response.status_code == 200
+    assert [p["id"] for p in client.get("/api/portfolios", params={"user_id": user_id}).json()] == [default_id]
+    assert client.get("/api/positions", params={"user_id": user_id}).json() == []
+
+def test_default_portfolio_upsert_losing_the_race_reads_the_winner(client, user_id, monkeypatch):
+    collection_type = type(server.db.portfolios)
+    upsert = collection_type.find_one_and_update
+
+    async def lose_the_race(self, filter, *args, **kwargs):
+        if self.name == "portfolios":
+            # The other request inserts its default portfolio first, so this upsert's insert collides with it
+            await server.db.portfolios.insert_one({"id": "winner", "user_id": user_id, "is_default": True})
+            filter = {**filter, "id": "never-matches"}
+        return await upsert(self, filter, *args, **kwargs)
+    monkeypatch.setattr(collection_type, "find_one_and_update", lose_the_race)
+
+    assert client.portal.call(server.ensure_default_portfolio_id, user_id) == "winner"
+
+def test_summary_totals(client, user_id):
+    client.post("/api/positions", params={"user_id": user_id},
+                json={"symbol": "AAPL", "type": "stock", "quantity": 10, "avg_price": 100.0})
+    client.post("/api/positions", params={"user_id": user_id},
+                json={"symbol": "MSFT", "type": "stock", "quantity": 1, "avg_price": 500.0})
+
+    summary = client.get("/api/portfolio/summary", params={"user_id": user_id}).json()
+    assert summary["total_invested"] == 1500
+    assert summary["positions_value"] == 2400
+    assert summary["total_gain_loss"] == 900
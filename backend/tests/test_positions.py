@@ -0,0 +1,96 @@
+import asyncio
+
+from fastapi import HTTPException
+
+import server
+from models import PositionCreate
+
+def add_position(client, user_id, **fields):
+    payload = {"symbol": "AAPL", "type": "stock", "quantity": 10, "avg_price": 100.0, **fields}
+    return client.post("/api/positions", params={"user_id": user_id}, json=payload)
+
+def test_buy_creates_then_merges_position(client, user_id):
+    response = add_position(client, user_id, symbol="aapl")
+    assert response.status_code == 200
+    created = response.json()
+    assert created["symbol"] == "AAPL"
+    assert created["quantity"] == 10
+
+    merged = add_position(client, user_id, quantity=10, avg_price=200.0).json()
+    assert merged["id"] == created["id"]
+    assert merged["quantity"] == 20
+    assert merged["avg_price"] == 150.0
+
+    positions = client.get("/api/positions", params={"user_id": user_id}).json()
+    assert [(p["symbol"], p["quantity"], p["avg_price"]) for p in positions] == [("AAPL", 20, 150.0)]
+
+def test_sell_partially_then_fully(client, user_id):
+    add_position(client, user_id)
+
+    partial = add_position(client, user_id, transaction_type="sell", quantity=4, avg_price=120.0).json()
+    assert partial["quantity"] == 6
+    assert partial["avg_price"] == 100.0
+    assert partial["sale_total"] == 480.0
+
+    response = add_position(client, user_id, transaction_type="sell", quantity=7, avg_price=120.0)
+    assert response.status_code == 400
+
+    full = add_position(client, user_id, transaction_type="sell", quantity=6, avg_price=120.0).json()
+    assert full["quantity"] == 0
+    assert client.get("/api/positions", params={"user_id": user_id}).json() == []
+
+    transactions = client.get("/api/transactions", params={"user_id": user_id}).json()
+    assert sorted(t["type"] for t in transactions) == ["buy", "sell", "sell"]
+
+def test_concurrent_sells_cannot_oversell(client, user_id):
+    add_position(client, user_id)
+    sell = PositionCreate(symbol="AAPL", type="stock", transaction_type="sell", quantity=6, avg_price=120.0)
+
+    async def sell_twice():
+        return await asyncio.gather(server.add_position(user_id, sell), server.add_position(user_id, sell),
+                                    return_exceptions=True)
+
+    results = client.portal.call(sell_twice)
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 400
+    positions = client.get("/api/positions", params={"user_id": user_id}).json()
+    assert [p["quantity"] for p in positions] == [4]
+
+def test_sell_without_position_is_rejected(client, user_id):
+    response = add_position(client, user_id, transaction_type="sell")
+    assert response.status_code == 400
+
+def test_unknown_symbol_is_not_found(client, user_id):
+    response = add_position(client, user_id, symbol="NOPE")
+    assert response.status_code == 404
+
+def test_invalid_asset_type_is_rejected(client, user_id):
+    response = add_position(client, user_id, type="bond")
+    assert response.status_code == 422
+
+def test_transactions_are_streamed_as_stored(client, user_id):
+    legacy = {"id": "legacy", "user_id": user_id, "symbol": "AAPL", "type": "buy", "quantity": 1, "price": 10.0, "total": 10.0}
+    client.portal.call(server.db.transactions.insert_one, dict(legacy))
+    assert client.get("/api/transactions", params={"user_id": user_id}).json() == [legacy]
+
+def test_csv_import_inserts_valid_rows_and_reports_bad_ones(client, user_id):
+    rows = [
+        {"symbol": "aapl", "type": "stock", "quantity": "2", "avg_price": "100", "purchase_date": "2023-05-01T00:00:00"},
+        {"symbol": "MSFT", "quantity": "many", "avg_price": "100"},
+        {"symbol": ""},
+    ]
+    result = client.post("/api/import/csv", params={"user_id": user_id}, json=rows).json()
+    assert result["imported"] == 1
+    assert len(result["errors"]) == 1 and "MSFT" in result["errors"][0]
+
+    positions = client.get("/api/positions", params={"user_id": user_id}).json()
+    assert [(p["symbol"], p["name"], p["quantity"]) for p in positions] == [("AAPL", "AAPL Inc", 2)]
+
+def test_merge_duplicate_positions(client, user_id):
+    rows = [{"symbol": "AAPL", "quantity": 10, "avg_price": 100}, {"symbol": "AAPL", "quantity": 30, "avg_price": 200}]
+    client.post("/api/import/csv", params={"user_id": user_id}, json=rows)
+
+    assert client.post("/api/positions/merge-duplicates", params={"user_id": user_id}).json()["merged"] == 1
+    positions = client.get("/api/positions", params={"user_id": user_id}).json()
+    assert [(p["quantity"], p["avg_price"]) for p in positions] == [(40, 175.0)]
+    assert client.post("/api/positions/merge-duplicates", params={"user_id": user_id}).json()["merged"] == 0
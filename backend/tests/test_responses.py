@@ -0,0 +1,109 @@
+import server
+from models import PerformanceResponse, PerformanceResponseCompact
+
+def test_quote_revalidates_by_etag(client):
+    response = client.get("/api/market/quote/AAPL")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.get("/api/market/quote/AAPL", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get("/api/market/quote/AAPL", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+def test_streamed_lists_empty_and_filled(client, user_id):
+    for path in ("/api/transactions", "/api/cash/transactions"):
+        response = client.get(path, params={"user_id": user_id})
+        assert response.status_code == 200
+        assert response.json() == []
+
+    client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": "deposit", "amount": 10})
+    client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": "deposit", "amount": 20})
+    transactions = client.get("/api/cash/transactions", params={"user_id": user_id}).json()
+    assert sorted(t["amount"] for t in transactions) == [10, 20]
+
+    paged = client.get("/api/cash/transactions", params={"user_id": user_id, "skip": 1, "limit": 1}).json()
+    assert len(paged) == 1
+
+def test_performance_layouts(client, user_id):
+    client.post("/api/positions", params={"user_id": user_id},
+                json={"symbol": "AAPL", "type": "stock", "quantity": 1, "avg_price": 150.0, "purchase_date": "2020-01-01T00:00:00"})
+
+    legacy = client.get("/api/analytics/performance", params={"user_id": user_id, "period": "1m"}).json()
+    compact = client.get("/api/analytics/performance", params={"user_id": user_id, "period": "1m", "compact": True}).json()
+
+    assert legacy["data"]
+    assert "data" not in compact
+    assert compact["dates"] == [row["date"] for row in legacy["data"]]
+    assert compact["values"] == [row["value"] for row in legacy["data"]]
+    assert compact["change_percents"] == [row["change_percent"] for row in legacy["data"]]
+    assert compact["total_return"] == legacy["total_return"]
+    PerformanceResponse.model_validate(legacy)
+    PerformanceResponseCompact.model_validate(compact)
+
+def test_performance_documents_both_layouts(client):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/analytics/performance"]["get"]["responses"]["200"]
+    refs = {option["$ref"].rsplit("/", 1)[-1] for option in response["content"]["application/json"]["schema"]["anyOf"]}
+    assert refs == {"PerformanceResponse", "PerformanceResponseCompact"}
+
+def test_empty_performance_layouts(client, user_id):
+    legacy = client.get("/api/analytics/performance", params={"user_id": user_id}).json()
+    compact = client.get("/api/analytics/performance", params={"user_id": user_id, "compact": True}).json()
+    assert legacy["data"] == []
+    assert compact["dates"] == compact["values"] == compact["change_percents"] == []
+
+def test_malformed_body_is_unprocessable(client, user_id):
+    response = client.post("/api/cash/transaction", params={"user_id": user_id}, content=b"{not json",
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+def test_request_bodies_are_documented_and_validated(client, user_id):
+    paths = client.get("/openapi.json").json()["paths"]
+    body = paths["/api/cash/transaction"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    assert body["$ref"].endswith("/CashTransactionCreate")
+    assert paths["/api/positions"]["post"]["requestBody"]["required"] is True
+
+    response = client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": "deposit"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "amount"]
+
+def test_correlation_is_revalidated_on_every_request(client, user_id):
+    for symbol in ("AAPL", "MSFT"):
+        client.post("/api/positions", params={"user_id": user_id},
+                    json={"symbol": symbol, "type": "stock", "quantity": 1, "avg_price": 100.0})
+    response = client.get("/api/analytics/correlation", params={"user_id": user_id})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get("/api/analytics/correlation", params={"user_id": user_id},
+                          headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+def test_symbol_cache_entries_ignore_casing(client, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    admin = {"X-Admin-Token": "secret"}
+    assert client.get("/api/market/quote/aapl").json()["symbol"] == "AAPL"
+    removed = client.post("/api/admin/cache/invalidate/Aapl", headers=admin).json()["removed"]
+    assert removed >= 1
+    assert client.post("/api/admin/cache/invalidate/AAPL", headers=admin).json()["removed"] == 0
+
+def test_cache_invalidation_requires_the_admin_token(client, monkeypatch):
+    assert client.post("/api/admin/cache/invalidate/AAPL").status_code == 403
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    assert client.post("/api/admin/cache/invalidate/AAPL").status_code == 403
+    assert client.post("/api/admin/cache/invalidate/AAPL", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.post("/api/admin/cache/invalidate/AAPL", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+def test_cors_credentials_setting(monkeypatch):
+    monkeypatch.delenv("CORS_ALLOW_CREDENTIALS", raising=False)
+    assert server.cors_allow_credentials(["https://app.example.com"]) is True
+    assert server.cors_allow_credentials(["*"]) is False
+
+    monkeypatch.setenv("CORS_ALLOW_CREDENTIALS", "false")
+    assert server.cors_allow_credentials(["https://app.example.com"]) is False
+    monkeypatch.setenv("CORS_ALLOW_CREDENTIALS", "true")
+    assert server.cors_allow_credentials(["*"]) is True
@@ -0,0 +1,88 @@
+import fastapi.routing
+import pytest
+
+import server
+
+@pytest.fixture
+def encoded_by_handler(monkeypatch):
+    """Fail any request whose handler left the encoding to FastAPI's jsonable_encoder path"""
+    async def serialize_response(*args, **kwargs):
+        raise AssertionError("response went through FastAPI's serialize_response")
+    monkeypatch.setattr(fastapi.routing, "serialize_response", serialize_response)
+
+def test_model_routes_encode_their_own_response(client, encoded_by_handler):
+    response = client.post("/api/auth/register", json={"name": "Ann", "email": "ann@example.com", "password": "pw"})
+    assert response.status_code == 200
+    user_id = response.json()["id"]
+    assert client.post("/api/auth/login", json={"email": "ann@example.com", "password": "pw"}).json()["id"] == user_id
+
+    position_id = "p1"
+    client.portal.call(server.db.positions.insert_one, {"id": position_id, "user_id": user_id, "symbol": "AAPL"})
+    dividend = client.post("/api/dividends", params={"user_id": user_id},
+                           json={"position_id": position_id, "amount": 1.5, "date": "2025-03-01T00:00:00"}).json()
+    assert (dividend["symbol"], dividend["date"]) == ("AAPL", "2025-03-01T00:00:00")
+
+    goal = client.post("/api/goals", params={"user_id": user_id},
+                       json={"title": "Retraite", "target_amount": 1000, "target_date": "2030-01-01T00:00:00"}).json()
+    assert goal["target_date"] == "2030-01-01T00:00:00"
+
+    note = client.post("/api/notes", params={"user_id": user_id}, json={"position_id": "p1", "content": "hello"}).json()
+    assert note["content"] == "hello"
+
+    assert client.get("/api/budget", params={"user_id": user_id}).json() is None
+    budget = client.post("/api/budget", params={"user_id": user_id},
+                         json={"monthly_amount": 200, "start_date": "2025-01-01T00:00:00"}).json()
+    assert budget["monthly_amount"] == 200
+    assert client.get("/api/budget", params={"user_id": user_id}).json() == budget
+
+def test_position_routes_encode_their_own_response(client, user_id, encoded_by_handler):
+    def trade(transaction_type, quantity):
+        return client.post("/api/positions", params={"user_id": user_id}, json={
+            "symbol": "AAPL", "type": "stock", "transaction_type": transaction_type, "quantity": quantity, "avg_price": 100.0
+        })
+
+    assert trade("buy", 2).status_code == 200
+    assert trade("buy", 2).json()["quantity"] == 4
+    assert trade("sell", 1).json()["quantity"] == 3
+    positions = client.get("/api/positions", params={"user_id": user_id}).json()
+    assert positions[0]["symbol"] == "AAPL"
+    assert positions[0]["purchase_date"].startswith("20")
+    assert trade("sell", 3).json()["quantity"] == 0
+
+def test_alert_lists_encode_their_own_response(client, user_id, encoded_by_handler):
+    client.portal.call(server.db.alerts.insert_one, {
+        "id": "a1", "user_id": user_id, "symbol": "AAPL", "alert_type": "price_above", "target_value": 150.0,
+        "is_active": True, "is_triggered": True, "is_acknowledged": False
+    })
+    assert [a["id"] for a in client.get("/api/alerts/triggered", params={"user_id": user_id}).json()] == ["a1"]
+    assert [a["id"] for a in client.get("/api/alerts", params={"user_id": user_id}).json()] == ["a1"]
+
+@pytest.mark.parametrize("path", [
+    "/api/portfolio/summary",
+    "/api/analytics/performance",
+    "/api/analytics/compare-index",
+    "/api/analytics/sector-distribution",
+    "/api/analytics/recommendations",
+])
+def test_analytics_routes_encode_their_own_response(client, user_id, encoded_by_handler, path):
+    assert client.get(path, params={"user_id": user_id}).status_code == 200
+    for symbol in ("AAPL", "MSFT"):
+        client.post("/api/positions", params={"user_id": user_id},
+                    json={"symbol": symbol, "type": "stock", "quantity": 2, "avg_price": 100.0, "purchase_date": "2024-01-01T00:00:00"})
+    assert client.get(path, params={"user_id": user_id, "period": "1m"}).status_code == 200
+
+def test_portfolio_and_cash_account_lists_encode_their_own_response(client, user_id, encoded_by_handler):
+    portfolios = client.get("/api/portfolios", params={"user_id": user_id}).json()
+    assert [p["is_default"] for p in portfolios] == [True]
+
+    accounts = client.get("/api/cash-accounts", params={"user_id": user_id}).json()
+    assert [sorted(a) for a in accounts] == [["balance", "currency", "id", "portfolio_id", "updated_at"]]
+    assert [a["id"] for a in client.get("/api/cash-accounts", params={"user_id": user_id}).json()] == [accounts[0]["id"]]
+
+def test_post_routes_encode_their_own_response(client, user_id, encoded_by_handler):
+    portfolio = client.post("/api/portfolios", params={"user_id": user_id}, json={"name": "PEA"}).json()
+    assert (portfolio["name"], portfolio["is_default"]) == ("PEA", False)
+    assert "_id" not in portfolio and portfolio["created_at"]
+
+    response = client.post("/api/cash/transaction", params={"user_id": user_id}, json={"type": "deposit", "amount": 10})
+    assert response.json()["new_balance"] == 10
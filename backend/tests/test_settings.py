@@ -0,0 +1,15 @@
+def settings(client, user_id):
+    return client.get("/api/settings", params={"user_id": user_id}).json()
+
+def test_defaults(client, user_id):
+    current = settings(client, user_id)
+    assert (current["risk_free_rate"], current["benchmark_index"]) == (3.0, "^GSPC")
+
+def test_update_only_changes_the_fields_sent(client, user_id):
+    client.put("/api/settings", params={"user_id": user_id}, json={"risk_free_rate": 4.5})
+    client.put("/api/settings", params={"user_id": user_id}, json={"benchmark_index": "^FCHI"})
+    current = settings(client, user_id)
+    assert (current["risk_free_rate"], current["benchmark_index"]) == (4.5, "^FCHI")
+
+    client.put("/api/settings", params={"user_id": user_id}, json={"risk_free_rate": None})
+    assert settings(client, user_id)["risk_free_rate"] == 4.5
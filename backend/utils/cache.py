@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# In-process TTL caches: key -> (monotonic timestamp, value); a None value marks an invalidated entry
+CACHE_MAX_ENTRIES = 4096
+_cache_lock = threading.Lock()  # cached services run in worker threads
+_fetch_locks = {}  # cache key -> [lock held while that entry is being fetched, number of holders/waiters]
+
+def cache_get(cache: dict, key: str, max_age: float):
+    """Cached value for key if younger than max_age seconds, else None"""
+    with _cache_lock:
+        entry = cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < max_age:
+        return entry[1]
+    return None
+
+def cache_set(cache: dict, key: str, value, read_at: Optional[float] = None) -> None:
+    """Store value for key; with read_at (monotonic time the value was read), skip it if the key was
+    invalidated since, so a slow reader cannot put back a value older than the invalidation"""
+    with _cache_lock:
+        entry = cache.pop(key, None)
+        if read_at is not None and entry is not None and entry[1] is None and entry[0] >= read_at:
+            cache[key] = entry
+            return
+        if len(cache) >= CACHE_MAX_ENTRIES:
+            # Evict the oldest entry (dicts keep insertion order)
+            cache.pop(next(iter(cache)))
+        cache[key] = (time.monotonic(), value)
+
+def cache_invalidate(cache: dict, key: str) -> None:
+    """Forget key, remembering when so that cache_set(read_at=...) from an earlier read is ignored"""
+    with _cache_lock:
+        cache.pop(key, None)
+        if len(cache) >= CACHE_MAX_ENTRIES:
+            cache.pop(next(iter(cache)))
+        cache[key] = (time.monotonic(), None)
+
+def cache_drop(cache: dict, matches: Callable[[str], bool]) -> int:
+    """Drop every entry whose key satisfies matches(key); returns how many were removed"""
+    with _cache_lock:
+        keys = [key for key in cache if matches(key)]
+        for key in keys:
+            del cache[key]
+    return len(keys)
+
+def symbol_keys(symbol: str) -> Callable[[str], bool]:
+    """Key predicate for a symbol's entries: the plain symbol or "SYMBOL:..." keys"""
+    prefix = f"{symbol}:"
+    return lambda key: key == symbol or key.startswith(prefix)
+
+@contextmanager
+def fetch_lock(key: str) -> Iterator[None]:
+    """Per-key lock so concurrent misses on the same entry wait for a single fetch;
+    the lock is forgotten once nobody holds or waits for it, so keys don't accumulate"""
+    with _cache_lock:
+        entry = _fetch_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _cache_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _fetch_locks[key]
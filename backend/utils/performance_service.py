@@ -1,6 +1,5 @@
 import pandas as pd
-import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict
 from datetime import datetime, timedelta
 from .yahoo_finance import YahooFinanceService
 import logging
@@ -13,10 +12,44 @@ class PerformanceService:
     def __init__(self):
         self.yf_service = YahooFinanceService()
     
+    @staticmethod
+    def _build_performance_columns(values: pd.Series, initial_value: float) -> Dict[str, List]:
+        """Build parallel dates/values/change_percents arrays from a value series in one vectorized pass"""
+        if initial_value > 0:
+            change_percents = ((values - initial_value) / initial_value * 100).round(2).tolist()
+        else:
+            change_percents = [0] * len(values)
+        return {
+            'dates': values.index.strftime('%Y-%m-%d').tolist(),
+            'values': values.round(2).tolist(),
+            'change_percents': change_percents
+        }
+    
+    @staticmethod
+    def _format_series(columns: Dict[str, List], compact: bool = False) -> Dict:
+        """Return the column arrays as-is (compact) or as the legacy list of date/value/change_percent rows"""
+        if compact:
+            return columns
+        return {
+            'data': [
+                {'date': date, 'value': value, 'change_percent': change_percent}
+                for date, value, change_percent in zip(
+                    columns['dates'], columns['values'], columns['change_percents']
+                )
+            ]
+        }
+    
+    @classmethod
+    def empty_performance(cls, compact: bool = False) -> Dict:
+        """Empty performance result in the requested layout"""
+        series = cls._format_series({'dates': [], 'values': [], 'change_percents': []}, compact)
+        return {**series, 'total_return': 0, 'total_return_percent': 0}
+    
     def calculate_portfolio_performance(
         self, 
         positions: List[Dict], 
-        period: str = 'all'
+        period: str = 'all',
+        compact: bool = False
     ) -> Dict:
         """
         Calculate portfolio performance over time
@@ -27,7 +60,7 @@ class PerformanceService:
         """
         try:
             if not positions:
-                return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+                return self.empty_performance(compact)
             
             # Determine date range
             end_date = datetime.now()
@@ -47,34 +80,31 @@ class PerformanceService:
                 start_date = min(purchase_dates) if purchase_dates else end_date - timedelta(days=365)
             
             # Collect historical data for all positions into separate series
+            # (tz-naive daily closes for every symbol from one batched, cached download)
+            closes = self.yf_service.get_historical_closes([p['symbol'] for p in positions], period='2y')
             position_series = {}
             
             for position in positions:
                 symbol = position['symbol']
-                hist_data = self.yf_service.get_historical_data(symbol, period='2y')
-                
-                if hist_data is None or hist_data.empty:
+                if symbol not in closes:
                     logger.warning(f"No historical data for {symbol}, skipping")
                     continue
                 
-                # Make dates timezone naive for comparison
-                if hist_data.index.tz is not None:
-                    hist_data.index = hist_data.index.tz_localize(None)
-                
                 # Filter by date range
-                hist_data = hist_data[hist_data.index >= start_date]
+                symbol_closes = closes[symbol].dropna()
+                symbol_closes = symbol_closes[symbol_closes.index >= start_date]
                 
-                if hist_data.empty:
+                if symbol_closes.empty:
                     logger.warning(f"No data for {symbol} in the selected period")
                     continue
                 
                 # Calculate position value over time (price * quantity)
                 quantity = position['quantity']
-                position_values = hist_data['Close'] * quantity
+                position_values = symbol_closes * quantity
                 position_series[symbol] = position_values
             
             if not position_series:
-                return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+                return self.empty_performance(compact)
             
             # Create a DataFrame with all position values
             # This aligns all series to a common date index automatically
@@ -95,7 +125,7 @@ class PerformanceService:
             df = df.dropna()
             
             if df.empty:
-                return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+                return self.empty_performance(compact)
             
             # Calculate total portfolio value per day
             df['total_value'] = df.sum(axis=1)
@@ -104,18 +134,9 @@ class PerformanceService:
             initial_value = df['total_value'].iloc[0]
             
             if initial_value <= 0:
-                return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+                return self.empty_performance(compact)
             
-            performance_data = []
-            for date, row in df.iterrows():
-                value = row['total_value']
-                change_percent = ((value - initial_value) / initial_value * 100)
-                
-                performance_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'value': round(value, 2),
-                    'change_percent': round(change_percent, 2)
-                })
+            columns = self._build_performance_columns(df['total_value'], initial_value)
             
             # Calculate total return
             final_value = df['total_value'].iloc[-1]
@@ -123,7 +144,7 @@ class PerformanceService:
             total_return_percent = ((final_value - initial_value) / initial_value * 100)
             
             return {
-                'data': performance_data,
+                **self._format_series(columns, compact),
                 'total_return': round(total_return, 2),
                 'total_return_percent': round(total_return_percent, 2)
             }
@@ -132,7 +153,7 @@ class PerformanceService:
             logger.error(f"Error calculating portfolio performance: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
-            return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+            return self.empty_performance(compact)
     
     def calculate_position_performance(
         self, 
@@ -140,7 +161,8 @@ class PerformanceService:
         quantity: float,
         purchase_price: float,
         purchase_date: datetime,
-        period: str = 'all'
+        period: str = 'all',
+        compact: bool = False
     ) -> Dict:
         """Calculate performance for a single position"""
         try:
@@ -166,29 +188,18 @@ class PerformanceService:
             hist_data = self.yf_service.get_historical_data(symbol, period='2y')
             
             if hist_data is None or hist_data.empty:
-                return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+                return self.empty_performance(compact)
             
             # Filter by date range - make dates timezone naive for comparison
             hist_data.index = hist_data.index.tz_localize(None)
             hist_data = hist_data[hist_data.index >= start_date]
             
             # Calculate performance
-            performance_data = []
             initial_value = purchase_price * quantity
+            columns = self._build_performance_columns(hist_data['Close'] * quantity, initial_value)
             
-            for date, row in hist_data.iterrows():
-                current_price = row['Close']
-                current_value = current_price * quantity
-                change_percent = ((current_value - initial_value) / initial_value * 100) if initial_value > 0 else 0
-                
-                performance_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'value': round(current_value, 2),
-                    'change_percent': round(change_percent, 2)
-                })
-            
-            if performance_data:
-                final_value = performance_data[-1]['value']
+            if columns['values']:
+                final_value = columns['values'][-1]
                 total_return = final_value - initial_value
                 total_return_percent = ((final_value - initial_value) / initial_value * 100) if initial_value > 0 else 0
             else:
@@ -196,14 +207,14 @@ class PerformanceService:
                 total_return_percent = 0
             
             return {
-                'data': performance_data,
+                **self._format_series(columns, compact),
                 'total_return': round(total_return, 2),
                 'total_return_percent': round(total_return_percent, 2)
             }
             
         except Exception as e:
             logger.error(f"Error calculating position performance for {symbol}: {str(e)}")
-            return {'data': [], 'total_return': 0, 'total_return_percent': 0}
+            return self.empty_performance(compact)
     
     def compare_with_index(
         self,
@@ -1,18 +1,86 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+from itertools import combinations
+from .cache import cache_drop, cache_get, cache_set, symbol_keys
 from .yahoo_finance import YahooFinanceService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Per-symbol beta/volatility computed from daily closes: they only move once a day
+METRICS_CACHE_DURATION = 3600  # 1 hour
+_metrics_cache = {}  # "SYMBOL:period:market_index" -> {'beta', 'volatility'}; "corr:SYMBOLS:period" -> matrix
+
+def _metrics_key(symbol: str, period: str, market_index: str) -> str:
+    # Upper-case like every symbol cache key, so callers' casing doesn't split entries
+    return f"{symbol.upper()}:{period}:{market_index.upper()}"
+
 class PortfolioAnalytics:
     """Analytics for portfolio calculations"""
     
     def __init__(self):
         self.yf_service = YahooFinanceService()
     
+    @staticmethod
+    def invalidate_symbol(symbol: str) -> int:
+        """Forget cached beta/volatility for a symbol and every cached correlation matrix that includes it"""
+        symbol = symbol.upper()
+        is_symbol_key = symbol_keys(symbol)
+        return cache_drop(
+            _metrics_cache,
+            lambda key: is_symbol_key(key) or (key.startswith('corr:') and symbol in key.split(':')[1].split(','))
+        )
+    
+    @staticmethod
+    def calculate_position_values(positions: List[Dict], prices: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """Vectorized price/value/invested/gain-loss columns for positions (missing prices fall back to avg_price)"""
+        count = len(positions)
+        quantity = np.fromiter((p['quantity'] for p in positions), dtype=np.float64, count=count)
+        avg_price = np.fromiter((p['avg_price'] for p in positions), dtype=np.float64, count=count)
+        price = np.fromiter((prices.get(p['symbol'], np.nan) for p in positions), dtype=np.float64, count=count)
+        price = np.where(np.isnan(price), avg_price, price)
+        
+        total_value = quantity * price
+        invested = quantity * avg_price
+        gain_loss = total_value - invested
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain_loss_percent = np.where(invested > 0, gain_loss / invested * 100, 0.0)
+        
+        return {
+            'current_price': price,
+            'total_value': total_value,
+            'invested': invested,
+            'gain_loss': gain_loss,
+            'gain_loss_percent': gain_loss_percent,
+            'portfolio_value': np.vdot(quantity, price)
+        }
+    
+    @staticmethod
+    def calculate_daily_change(positions: List[Dict], changes: Dict[str, Optional[Dict]], portfolio_value: float) -> Tuple[float, float]:
+        """Vectorized portfolio daily change: amount and value-weighted percent from per-symbol daily changes"""
+        count = len(positions)
+        rows = [changes.get(p['symbol']) or {} for p in positions]
+        quantity = np.fromiter((p['quantity'] for p in positions), dtype=np.float64, count=count)
+        price = np.fromiter(
+            (row.get('current_price', p['avg_price']) for row, p in zip(rows, positions)), dtype=np.float64, count=count
+        )
+        price_change = np.fromiter((row.get('price_change', 0) for row in rows), dtype=np.float64, count=count)
+        change_percent = np.fromiter((row.get('change_percent', 0) for row in rows), dtype=np.float64, count=count)
+        
+        daily_change = float(quantity @ price_change)
+        daily_change_percent = float((quantity * price / portfolio_value) @ change_percent) if portfolio_value > 0 else 0.0
+        return daily_change, daily_change_percent
+    
+    @staticmethod
+    def _weighted_returns(weights: List[float], returns_data: List[pd.Series], index: pd.Index) -> pd.Series:
+        """Weighted portfolio returns on index: align every series into one matrix, then a single dot product"""
+        matrix = np.column_stack([
+            returns.reindex(index, fill_value=0).to_numpy(dtype=float) for returns in returns_data
+        ])
+        return pd.Series(matrix @ np.asarray(weights, dtype=float), index=index)
+    
     def calculate_portfolio_volatility(self, positions: List[Dict], period: str = '1y') -> Dict[str, float]:
         """Calculate portfolio volatility (historical annualized)"""
         try:
@@ -34,10 +102,7 @@ class PortfolioAnalytics:
                 return {'historical': 0.0, 'realized': 0.0}
             
             # Combine returns weighted by position size
-            portfolio_returns = pd.Series(0, index=returns_data[0].index)
-            for weight, returns in zip(weights, returns_data):
-                aligned_returns = returns.reindex(portfolio_returns.index, fill_value=0)
-                portfolio_returns += weight * aligned_returns
+            portfolio_returns = self._weighted_returns(weights, returns_data, returns_data[0].index)
             
             # Calculate historical volatility (annualized)
             historical_vol = self.yf_service.calculate_volatility(portfolio_returns, annualize=True)
@@ -101,15 +166,12 @@ class PortfolioAnalytics:
             if min_length < 2:
                 return 0.0
             
-            # Combine weighted returns
-            combined_returns = pd.Series(0.0, index=range(min_length))
-            for weight, returns in zip(weights, returns_data):
-                # Take last min_length returns
-                recent_returns = returns.tail(min_length).reset_index(drop=True)
-                combined_returns += weight * recent_returns
+            # Combine weighted returns over the last min_length observations of each series
+            recent_returns = np.column_stack([returns.to_numpy(dtype=float)[-min_length:] for returns in returns_data])
+            combined_returns = recent_returns @ np.asarray(weights, dtype=float)
             
             # Calculate annualized volatility
-            realized_vol = float(combined_returns.std() * np.sqrt(252) * 100)
+            realized_vol = float(combined_returns.std(ddof=1) * np.sqrt(252) * 100)
             
             return round(realized_vol, 2)
         except Exception as e:
@@ -183,12 +245,7 @@ class PortfolioAnalytics:
                 return 1.0
             
             # Combine returns using common index
-            common_index = market_returns.index
-            portfolio_returns = pd.Series(0, index=common_index)
-            
-            for weight, returns in zip(weights, returns_data):
-                aligned_returns = returns.reindex(common_index, fill_value=0)
-                portfolio_returns += weight * aligned_returns
+            portfolio_returns = self._weighted_returns(weights, returns_data, market_returns.index)
             
             beta = self.yf_service.calculate_beta(portfolio_returns, market_returns)
             logger.info(f"Calculated portfolio beta: {beta} (vs {market_index})")
@@ -197,6 +254,74 @@ class PortfolioAnalytics:
             logger.error(f"Error calculating portfolio beta: {str(e)}")
             return 1.0
     
+    def _batch_returns(self, symbols: List[str], period: str) -> pd.DataFrame:
+        """Daily returns for several symbols: cached per symbol, the missing ones from one download"""
+        return self.yf_service.get_historical_returns(symbols, period)
+    
+    @staticmethod
+    def _pairwise_betas(returns: pd.DataFrame, market_returns: pd.Series) -> pd.Series:
+        """Beta of every column against the market over the dates both have data (1.0 when undefined)"""
+        asset = returns.to_numpy(dtype=float)
+        market = market_returns.to_numpy(dtype=float)[:, None]
+        valid = ~np.isnan(asset) & ~np.isnan(market)
+        count = valid.sum(axis=0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            asset_dev = np.where(valid, asset - np.where(valid, asset, 0.0).sum(axis=0) / count, 0.0)
+            market_dev = np.where(valid, market - np.where(valid, market, 0.0).sum(axis=0) / count, 0.0)
+            covariance = (asset_dev * market_dev).sum(axis=0) / (count - 1)
+            market_variance = (market_dev * market_dev).sum(axis=0) / (count - 1)
+            betas = covariance / market_variance
+        
+        betas = np.where((count >= 2) & (market_variance != 0) & np.isfinite(betas), betas, 1.0)
+        return pd.Series(betas, index=returns.columns)
+    
+    def calculate_batch_metrics(
+        self, symbols: List[str], period: str = '1y', market_index: str = '^GSPC', max_age: float = METRICS_CACHE_DURATION
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Beta and volatility for several symbols from a single history download (symbol -> {'beta', 'volatility'}).
+        Results are cached per symbol/period/benchmark, so only symbols missing from the cache
+        (or cached longer than max_age ago) are computed.
+        """
+        metrics = {}
+        for symbol in symbols:
+            cached = cache_get(_metrics_cache, _metrics_key(symbol, period, market_index), max_age)
+            if cached is not None:
+                metrics[symbol] = dict(cached)
+        missing = [symbol for symbol in symbols if symbol not in metrics]
+        if not missing:
+            return metrics
+        try:
+            returns = self._batch_returns(missing + [market_index], period)
+            volatilities = (returns.std() * np.sqrt(252) * 100).fillna(0.0)
+            
+            if market_index in returns:
+                betas = self._pairwise_betas(returns, returns[market_index])
+            else:
+                logger.warning(f"No market data for beta calculation against {market_index}")
+                betas = pd.Series(1.0, index=returns.columns)
+            
+            for symbol in missing:
+                if symbol in returns:
+                    metrics[symbol] = {
+                        'beta': round(float(betas[symbol]), 2),
+                        'volatility': round(float(volatilities[symbol]), 2)
+                    }
+                    cache_set(_metrics_cache, _metrics_key(symbol, period, market_index), dict(metrics[symbol]))
+        except Exception as e:
+            logger.error(f"Error calculating batch metrics for {missing}: {str(e)}")
+        
+        # Fall back to per-symbol calculation for anything the batch missed (not cached: may be a default)
+        for symbol in missing:
+            if symbol not in metrics:
+                metrics[symbol] = {
+                    'beta': self.calculate_position_beta(symbol, period, market_index),
+                    'volatility': self.calculate_position_volatility(symbol, period)
+                }
+        
+        return metrics
+    
     def calculate_position_beta(self, symbol: str, period: str = '1y', market_index: str = '^GSPC') -> float:
         """Calculate beta for a single position against the specified market index"""
         try:
@@ -246,32 +371,26 @@ class PortfolioAnalytics:
             return 0.0
     
     def calculate_correlation_matrix(self, symbols: List[str], period: str = '1y') -> List[Dict]:
-        """Calculate correlation matrix between positions"""
+        """Calculate correlation matrix between positions (the matrix is cached per symbol set and period)"""
         try:
-            correlations = []
-            returns_dict = {}
-            
-            # Get returns for all symbols
-            for symbol in symbols:
-                hist_data = self.yf_service.get_historical_data(symbol, period)
-                if hist_data is not None and not hist_data.empty:
-                    returns_dict[symbol] = self.yf_service.calculate_returns(hist_data['Close'])
-            
-            # Calculate pairwise correlations
-            symbols_with_data = list(returns_dict.keys())
-            for i, symbol1 in enumerate(symbols_with_data):
-                for symbol2 in symbols_with_data[i+1:]:
-                    corr = self.yf_service.calculate_correlation(
-                        returns_dict[symbol1],
-                        returns_dict[symbol2]
-                    )
-                    correlations.append({
-                        'symbol1': symbol1,
-                        'symbol2': symbol2,
-                        'correlation': round(corr, 2)
-                    })
-            
-            return correlations
+            symbols = [symbol.upper() for symbol in symbols]  # cache keys are upper-case whatever the caller's casing
+            cache_key = f"corr:{','.join(sorted(set(symbols)))}:{period}"
+            corr_matrix = cache_get(_metrics_cache, cache_key, METRICS_CACHE_DURATION)
+            if corr_matrix is None:
+                # Get returns for all symbols in one download, then all pairwise correlations at once
+                corr_matrix = self._batch_returns(symbols, period).corr().fillna(0.0)
+                if not corr_matrix.empty:
+                    cache_set(_metrics_cache, cache_key, corr_matrix)
+            
+            symbols_with_data = [symbol for symbol in dict.fromkeys(symbols) if symbol in corr_matrix.index]
+            return [
+                {
+                    'symbol1': symbol1,
+                    'symbol2': symbol2,
+                    'correlation': round(float(corr_matrix.at[symbol1, symbol2]), 2)
+                }
+                for symbol1, symbol2 in combinations(symbols_with_data, 2)
+            ]
         except Exception as e:
             logger.error(f"Error calculating correlation matrix: {str(e)}")
             return []
@@ -296,10 +415,7 @@ class PortfolioAnalytics:
                 return 0.0
             
             # Combine returns
-            portfolio_returns = pd.Series(0, index=returns_data[0].index)
-            for weight, returns in zip(weights, returns_data):
-                aligned_returns = returns.reindex(portfolio_returns.index, fill_value=0)
-                portfolio_returns += weight * aligned_returns
+            portfolio_returns = self._weighted_returns(weights, returns_data, returns_data[0].index)
             
             sharpe = self.yf_service.calculate_sharpe_ratio(portfolio_returns)
             return round(sharpe, 2)
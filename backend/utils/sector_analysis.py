@@ -1,37 +1,75 @@
 import yfinance as yf
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
+from .cache import cache_drop, cache_get, cache_set, symbol_keys
+from .yahoo_finance import TICKER_INFO_CACHE_DURATION
 
 logger = logging.getLogger(__name__)
 
+SECTOR_LOOKUP_WORKERS = 8  # parallel Yahoo info lookups per distribution
+_sector_cache = {}  # symbol -> get_sector_info result (sectors practically never change)
+
 class SectorAnalysisService:
     """Service for sector analysis and diversification"""
     
     @staticmethod
     def get_sector_info(symbol: str) -> Dict:
-        """Get sector information for a symbol"""
+        """Get sector information for a symbol (cached like ticker info)"""
+        symbol = symbol.upper()  # cache keys are upper-case whatever the caller's casing
+        cached = cache_get(_sector_cache, symbol, TICKER_INFO_CACHE_DURATION)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             ticker = yf.Ticker(symbol)
             info = ticker.info
             
-            return {
+            sector_info = {
                 'symbol': symbol,
                 'sector': info.get('sector', 'Unknown'),
-                'industry': info.get('industry', 'Unknown')
+                'industry': info.get('industry', 'Unknown'),
+                'quote_type': info.get('quoteType', '')
             }
+            cache_set(_sector_cache, symbol, sector_info)
+            return dict(sector_info)
         except Exception as e:
             logger.error(f"Error getting sector info for {symbol}: {str(e)}")
             return {
                 'symbol': symbol,
                 'sector': 'Unknown',
-                'industry': 'Unknown'
+                'industry': 'Unknown',
+                'quote_type': ''
             }
     
+    @staticmethod
+    def invalidate_symbol(symbol: str) -> int:
+        """Forget the cached sector information for a symbol"""
+        return cache_drop(_sector_cache, symbol_keys(symbol.upper()))
+    
+    @staticmethod
+    def get_stock_sector(symbol: str) -> str:
+        """Sector label for a stock, from a single info lookup"""
+        sector_info = SectorAnalysisService.get_sector_info(symbol)
+        sector = sector_info['sector']
+        # If sector is Unknown for a stock, it might be an ETF or special asset
+        if sector == 'Unknown' and sector_info['quote_type'] == 'ETF':
+            sector = f"ETF ({symbol})"
+        return sector
+    
     @staticmethod
     def calculate_sector_distribution(positions: List[Dict]) -> List[Dict]:
         """Calculate sector distribution of portfolio"""
         sector_values = {}
-        total_value = sum(p['total_value'] for p in positions)
+        total_value = 0
+        
+        # Look up the sector of every distinct stock concurrently (each lookup is one Yahoo round trip)
+        stock_symbols = list(dict.fromkeys(p['symbol'] for p in positions if p['type'] not in ('crypto', 'etf')))
+        if stock_symbols:
+            with ThreadPoolExecutor(max_workers=min(SECTOR_LOOKUP_WORKERS, len(stock_symbols))) as pool:
+                stock_sectors = dict(zip(stock_symbols, pool.map(SectorAnalysisService.get_stock_sector, stock_symbols)))
+        else:
+            stock_sectors = {}
         
         for position in positions:
             if position['type'] == 'crypto':
@@ -40,22 +78,10 @@ class SectorAnalysisService:
                 # ETFs don't have a single sector, display as "ETF (ticker)"
                 sector = f"ETF ({position['symbol']})"
             else:
-                sector_info = SectorAnalysisService.get_sector_info(position['symbol'])
-                sector = sector_info['sector']
-                # If sector is Unknown for a stock, it might be an ETF or special asset
-                if sector == 'Unknown':
-                    # Check if it's actually an ETF by looking at quoteType
-                    try:
-                        ticker = yf.Ticker(position['symbol'])
-                        quote_type = ticker.info.get('quoteType', '')
-                        if quote_type == 'ETF':
-                            sector = f"ETF ({position['symbol']})"
-                    except:
-                        pass
+                sector = stock_sectors[position['symbol']]
             
-            if sector not in sector_values:
-                sector_values[sector] = 0
-            sector_values[sector] += position['total_value']
+            sector_values[sector] = sector_values.get(sector, 0) + position['total_value']
+            total_value += position['total_value']
         
         # Convert to percentage
         distribution = []
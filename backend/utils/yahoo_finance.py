@@ -2,8 +2,9 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 from typing import Optional, List, Dict
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
+from .cache import cache_drop, cache_get, cache_set, fetch_lock, symbol_keys
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +13,17 @@ _exchange_rate_cache = {}
 _cache_timestamp = None
 CACHE_DURATION = 300  # 5 minutes
 
+# TTL caches for prices, ticker info and histories (read and written through utils.cache)
+PRICE_CACHE_DURATION = 30  # seconds
+TICKER_INFO_CACHE_DURATION = 86400  # 24 hours
+HISTORY_CACHE_DURATION = 300  # 5 minutes
+_price_cache = {}
+_ticker_info_cache = {}
+_history_cache = {}  # "SYMBOL:period" -> daily close series
+_history_frame_cache = {}  # "SYMBOL:period" -> full single-symbol history frame
+_returns_cache = {}  # "SYMBOL:period" -> daily returns of the cached close series
+_daily_change_cache = {}  # symbol -> get_daily_change result
+
 class YahooFinanceService:
     """Service for fetching data from Yahoo Finance"""
     
@@ -67,48 +79,188 @@ class YahooFinanceService:
         rate = YahooFinanceService.get_exchange_rate(from_currency, 'EUR')
         return amount * rate
     
+    @staticmethod
+    def invalidate_symbol(symbol: str) -> int:
+        """Forget cached prices, ticker info, daily changes, histories and returns for a symbol"""
+        symbol = symbol.upper()
+        return sum(
+            cache_drop(cache, symbol_keys(symbol))
+            for cache in (_price_cache, _ticker_info_cache, _daily_change_cache, _history_cache, _history_frame_cache, _returns_cache)
+        )
+    
     @staticmethod
     def get_current_price(symbol: str) -> Optional[float]:
-        """Get current price for a symbol"""
+        """Get current price for a symbol (cached for PRICE_CACHE_DURATION)"""
+        symbol = symbol.upper()  # cache keys are upper-case whatever the caller's casing
+        cached = cache_get(_price_cache, symbol, PRICE_CACHE_DURATION)
+        if cached is not None:
+            return cached
+        
         try:
             ticker = yf.Ticker(symbol)
             data = ticker.history(period='1d')
             if data.empty:
                 return None
-            return float(data['Close'].iloc[-1])
+            price = float(data['Close'].iloc[-1])
+            cache_set(_price_cache, symbol, price)
+            return price
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {str(e)}")
             return None
     
     @staticmethod
-    def get_ticker_info(symbol: str) -> Optional[Dict]:
-        """Get ticker information"""
+    def get_current_prices(symbols: List[str], max_age: float = PRICE_CACHE_DURATION) -> Dict[str, float]:
+        """Get current prices for several symbols with one batched download (symbols without data are omitted;
+        cached prices older than max_age are refetched)"""
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        
+        prices = {}
+        for symbol in symbols:
+            cached = cache_get(_price_cache, symbol.upper(), max_age)
+            if cached is not None:
+                prices[symbol] = cached
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if not missing:
+            return prices
+        
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            return {
-                'symbol': symbol,
-                'name': info.get('longName', info.get('shortName', symbol)),
-                'price': info.get('currentPrice', info.get('regularMarketPrice', 0)),
-                'change': info.get('regularMarketChange', 0),
-                'change_percent': info.get('regularMarketChangePercent', 0),
-                'volume': info.get('volume', 0)
-            }
+            data = yf.download(tickers=missing, period='1d', group_by='ticker', threads=True, progress=False)
+            if data is not None and not data.empty:
+                for symbol in missing:
+                    if isinstance(data.columns, pd.MultiIndex):
+                        if symbol.upper() not in data.columns.get_level_values(0):
+                            continue
+                        closes = data[symbol.upper()]['Close'].dropna()
+                    else:
+                        closes = data['Close'].dropna()
+                    if not closes.empty:
+                        prices[symbol] = float(closes.iloc[-1])
+                        cache_set(_price_cache, symbol.upper(), prices[symbol])
         except Exception as e:
-            logger.error(f"Error fetching info for {symbol}: {str(e)}")
-            return None
+            logger.error(f"Error fetching prices for {missing}: {str(e)}")
+        
+        # Fall back to single lookups for anything the batch missed
+        for symbol in missing:
+            if symbol not in prices:
+                price = YahooFinanceService.get_current_price(symbol)
+                if price is not None:
+                    prices[symbol] = price
+        
+        return prices
+    
+    @staticmethod
+    def get_ticker_info(symbol: str, max_age: float = TICKER_INFO_CACHE_DURATION) -> Optional[Dict]:
+        """Get ticker information (cached; pass a short max_age when the quote fields must be fresh)"""
+        symbol = symbol.upper()
+        cached = cache_get(_ticker_info_cache, symbol, max_age)
+        if cached is not None:
+            return dict(cached)
+        
+        # Single flight: concurrent misses for a symbol wait for the first fetch, then read the cache
+        with fetch_lock(f"info:{symbol}"):
+            cached = cache_get(_ticker_info_cache, symbol, max_age)
+            if cached is not None:
+                return dict(cached)
+            try:
+                ticker = yf.Ticker(symbol)
+                info = ticker.info
+                ticker_info = {
+                    'symbol': symbol,
+                    'name': info.get('longName', info.get('shortName', symbol)),
+                    'price': info.get('currentPrice', info.get('regularMarketPrice', 0)),
+                    'change': info.get('regularMarketChange', 0),
+                    'change_percent': info.get('regularMarketChangePercent', 0),
+                    'volume': info.get('volume', 0)
+                }
+                cache_set(_ticker_info_cache, symbol, ticker_info)
+                return dict(ticker_info)
+            except Exception as e:
+                logger.error(f"Error fetching info for {symbol}: {str(e)}")
+                return None
     
     @staticmethod
     def get_historical_data(symbol: str, period: str = '1y') -> Optional[pd.DataFrame]:
-        """Get historical data for a symbol"""
+        """Get historical data for a symbol (cached for HISTORY_CACHE_DURATION)"""
+        symbol = symbol.upper()
+        cache_key = f"{symbol}:{period}"
+        cached = cache_get(_history_frame_cache, cache_key, HISTORY_CACHE_DURATION)
+        if cached is not None:
+            # Callers re-index the frame they get: hand out a shallow copy so the cached one stays intact
+            return cached.copy(deep=False)
         try:
             ticker = yf.Ticker(symbol)
             data = ticker.history(period=period)
+            if data is not None and not data.empty:
+                cache_set(_history_frame_cache, cache_key, data.copy(deep=False))
             return data
         except Exception as e:
             logger.error(f"Error fetching historical data for {symbol}: {str(e)}")
             return None
     
+    @staticmethod
+    def get_historical_closes(symbols: List[str], period: str = '1y') -> pd.DataFrame:
+        """
+        Get daily closes for several symbols as one tz-naive column per symbol found.
+        Series are cached per symbol/period, so only symbols missing from the cache are downloaded (in one batch).
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return pd.DataFrame()
+        
+        columns = {}
+        for symbol in symbols:
+            cached = cache_get(_history_cache, f"{symbol.upper()}:{period}", HISTORY_CACHE_DURATION)
+            if cached is not None:
+                columns[symbol] = cached
+        missing = [symbol for symbol in symbols if symbol not in columns]
+        
+        if missing:
+            try:
+                data = yf.download(tickers=missing, period=period, group_by='ticker', threads=True, progress=False)
+                if data is not None and not data.empty:
+                    if data.index.tz is not None:
+                        data.index = data.index.tz_localize(None)
+                    for symbol in missing:
+                        if isinstance(data.columns, pd.MultiIndex):
+                            if symbol.upper() not in data.columns.get_level_values(0):
+                                continue
+                            closes = data[symbol.upper()]['Close']
+                        else:
+                            closes = data['Close']
+                        closes = closes.dropna()
+                        if not closes.empty:
+                            columns[symbol] = closes
+                            cache_set(_history_cache, f"{symbol.upper()}:{period}", closes)
+            except Exception as e:
+                logger.error(f"Error fetching historical data for {missing}: {str(e)}")
+        
+        return pd.DataFrame({symbol: columns[symbol] for symbol in symbols if symbol in columns})
+    
+    @staticmethod
+    def get_historical_returns(symbols: List[str], period: str = '1y') -> pd.DataFrame:
+        """
+        Daily returns for several symbols, one column per symbol found, each computed on its own trading days.
+        Return series are cached per symbol/period, so only symbols missing from the cache go through the closes.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        columns = {}
+        for symbol in symbols:
+            cached = cache_get(_returns_cache, f"{symbol.upper()}:{period}", HISTORY_CACHE_DURATION)
+            if cached is not None:
+                columns[symbol] = cached
+        missing = [symbol for symbol in symbols if symbol not in columns]
+        
+        if missing:
+            closes = YahooFinanceService.get_historical_closes(missing, period)
+            for symbol in closes.columns:
+                returns = YahooFinanceService.calculate_returns(closes[symbol].dropna())
+                columns[symbol] = returns
+                cache_set(_returns_cache, f"{symbol.upper()}:{period}", returns)
+        
+        return pd.DataFrame({symbol: columns[symbol] for symbol in symbols if symbol in columns})
+    
     @staticmethod
     def get_historical_data_by_dates(symbol: str, start_date: datetime, end_date: datetime = None) -> Optional[pd.DataFrame]:
         """Get historical data for a symbol between specific dates"""
@@ -208,34 +360,89 @@ class YahooFinanceService:
     
     @staticmethod
     def get_daily_change(symbol: str) -> Optional[Dict]:
-        """Get daily price change for a symbol"""
+        """Get daily price change for a symbol (cached as briefly as prices)"""
+        symbol = symbol.upper()
+        cached = cache_get(_daily_change_cache, symbol, PRICE_CACHE_DURATION)
+        if cached is not None:
+            return dict(cached)
+        
         try:
             ticker = yf.Ticker(symbol)
             data = ticker.history(period='2d')
             if data.empty or len(data) < 2:
                 # Try with info if history fails
                 info = ticker.info
-                return {
+                change = {
                     'current_price': info.get('currentPrice', info.get('regularMarketPrice', 0)),
                     'price_change': info.get('regularMarketChange', 0),
                     'change_percent': info.get('regularMarketChangePercent', 0)
                 }
+            else:
+                current_price = float(data['Close'].iloc[-1])
+                previous_price = float(data['Close'].iloc[-2])
+                price_change = current_price - previous_price
+                change_percent = (price_change / previous_price * 100) if previous_price > 0 else 0
+                
+                change = {
+                    'current_price': current_price,
+                    'previous_price': previous_price,
+                    'price_change': price_change,
+                    'change_percent': change_percent
+                }
             
-            current_price = float(data['Close'].iloc[-1])
-            previous_price = float(data['Close'].iloc[-2])
-            price_change = current_price - previous_price
-            change_percent = (price_change / previous_price * 100) if previous_price > 0 else 0
-            
-            return {
-                'current_price': current_price,
-                'previous_price': previous_price,
-                'price_change': price_change,
-                'change_percent': change_percent
-            }
+            cache_set(_daily_change_cache, symbol, change)
+            return dict(change)
         except Exception as e:
             logger.error(f"Error fetching daily change for {symbol}: {str(e)}")
             return None
     
+    @staticmethod
+    def get_daily_changes(symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get daily price changes for several symbols with one batched download (same shape as get_daily_change)"""
+        symbols = list(dict.fromkeys(symbols))
+        changes = {}
+        for symbol in symbols:
+            cached = cache_get(_daily_change_cache, symbol.upper(), PRICE_CACHE_DURATION)
+            if cached is not None:
+                changes[symbol] = dict(cached)
+        missing = [symbol for symbol in symbols if symbol not in changes]
+        if not missing:
+            return changes
+        
+        try:
+            # A few days back so the last two sessions are there even after a weekend or holiday
+            data = yf.download(tickers=missing, period='5d', group_by='ticker', threads=True, progress=False)
+            if data is not None and not data.empty:
+                for symbol in missing:
+                    if isinstance(data.columns, pd.MultiIndex):
+                        if symbol.upper() not in data.columns.get_level_values(0):
+                            continue
+                        closes = data[symbol.upper()]['Close'].dropna()
+                    else:
+                        closes = data['Close'].dropna()
+                    if len(closes) < 2:
+                        continue
+                    current_price = float(closes.iloc[-1])
+                    previous_price = float(closes.iloc[-2])
+                    price_change = current_price - previous_price
+                    change = {
+                        'current_price': current_price,
+                        'previous_price': previous_price,
+                        'price_change': price_change,
+                        'change_percent': (price_change / previous_price * 100) if previous_price > 0 else 0
+                    }
+                    cache_set(_daily_change_cache, symbol.upper(), change)
+                    changes[symbol] = dict(change)
+        except Exception as e:
+            logger.error(f"Error fetching daily changes for {missing}: {str(e)}")
+        
+        # Fall back to single lookups for anything the batch missed
+        for symbol in missing:
+            if symbol not in changes:
+                changes[symbol] = YahooFinanceService.get_daily_change(symbol)
+        
+        return changes
+    
     @staticmethod
     def search_ticker(query: str) -> List[Dict]:
         """Search for tickers (basic implementation)"""